@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the combined automaton of metre regexes."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import itertools
+import re
+import unittest
+
+from identify import automaton
+from identify import packed_pattern
+
+
+class CombinedMatcher(unittest.TestCase):
+
+  # Regexes (as in metrical_data) and their values; some of them overlap.
+  REGEXES = [
+      ('^GLGGLLLG$', {'a': True}),
+      ('^(LG|GL)L.$', {'b': True}),
+      ('^....LGL.$', {'c': set([2, 4])}),
+      ('^....LG(L|G).$', {'c': set([1]), 'd': set([3])}),
+      ('^G+L$', {'e': True}),
+      ('^.L?G$', {'f': True}),
+  ]
+
+  def setUp(self):
+    self.matcher = automaton.CombinedMatcher()
+    for (regex, value) in self.REGEXES:
+      self.matcher.Add(regex, value)
+
+  def _Expected(self, pattern):
+    """The merged values of the regexes that match, found with re one by one."""
+    expected = {}
+    for (regex, value) in self.REGEXES:
+      if re.match(regex, pattern):
+        for (metre_name, matched) in value.items():
+          if matched is True:
+            expected[metre_name] = True
+          else:
+            expected.setdefault(metre_name, set()).update(matched)
+    return expected
+
+  def testUnionOfRegexes(self):
+    """Each pattern should match exactly the regexes that re.match finds."""
+    for length in range(10):
+      for symbols in itertools.product('LG', repeat=length):
+        pattern = ''.join(symbols)
+        self.assertEqual(self.matcher.Matches(packed_pattern.Pack(pattern)),
+                         self._Expected(pattern), pattern)
+
+  def testMergedInOrderAdded(self):
+    """The values of the first regex added come first."""
+    self.assertEqual(list(self.matcher.Matches(packed_pattern.Pack('GLGGLGLG'))), ['c', 'd'])
+
+  def testStartStatePerLength(self):
+    """A pattern of a length that no regex can match is rejected without being read."""
+    self.assertEqual(self.matcher.Matches(packed_pattern.Pack('L')), {})
+    self.assertEqual(self.matcher._dfa.starts[1], automaton._DEAD)
+    # Only the regexes that can match 8 syllables are started for that length.
+    dfa = self.matcher._dfa
+    self.matcher.Matches(packed_pattern.Pack('G' * 8))
+    self.matcher.Matches(packed_pattern.Pack('G' * 4))
+    length_4_nodes = self.matcher._Closure([self.matcher._starts[1]])
+    self.assertTrue(length_4_nodes <= dfa.states[dfa.starts[4]])
+    self.assertFalse(length_4_nodes & dfa.states[dfa.starts[8]])
+    self.assertEqual(self.matcher.Matches(packed_pattern.Pack('G' * 7 + 'L')), {'e': True})
+
+  def testFromData(self):
+    """A matcher made from ToData should match the same."""
+    copy = automaton.CombinedMatcher()
+    copy.FromData(self.matcher.ToData())
+    for pattern in ['GLGGLLLG', 'GLGGLGLG', 'LGLL', 'GGGL', 'GG', 'LLLL']:
+      packed = packed_pattern.Pack(pattern)
+      self.assertEqual(copy.Matches(packed), self.matcher.Matches(packed))
+
+
+if __name__ == '__main__':
+  unittest.main()
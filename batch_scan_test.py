@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for batch_scan."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+import batch_scan
+from identify import packed_pattern
+import scan
+
+
+class SameAsScan(unittest.TestCase):
+
+  VERSES = [['karmaRyevADikAraste', 'mA Palezu kadAcana', 'mA karmaPalahetur BUr', 'mA te saNgo stvakarmaRi'],
+            [],
+            [''],
+            ['tat', 'kft', 'hy agacCat'],
+            ['rAma- lakzmaRO', 'hy agacCatAm'],
+            ['k', 'a', '', 'kt', 'ak']]
+
+  def _AssertSameAsScanVerse(self):
+    self.assertEqual(batch_scan.ScanVerses(self.VERSES),
+                     [[packed_pattern.Pack(pattern) for pattern in scan.ScanVerse(verse)]
+                      for verse in self.VERSES])
+
+  def testFallback(self):
+    """Without NumPy, ScanVerses should give the patterns of scan.ScanVerse, packed."""
+    numpy = batch_scan.numpy
+    batch_scan.numpy = None
+    try:
+      self._AssertSameAsScanVerse()
+    finally:
+      batch_scan.numpy = numpy
+
+  @unittest.skipIf(batch_scan.numpy is None, 'NumPy is not installed')
+  def testNumPy(self):
+    """With NumPy, ScanVerses should give the patterns of scan.ScanVerse, packed."""
+    self._AssertSameAsScanVerse()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,15 @@
+"""Scripts that time parts of the code; run each with python -m from the top-level directory."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import time
+
+
+def BestTime(function, runs):
+  """The shortest time, in seconds, taken by function() in the given number of runs."""
+  times = []
+  for _ in range(runs):
+    start = time.time()
+    function()
+    times.append(time.time() - start)
+  return min(times)
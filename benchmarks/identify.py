@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Measures identification speed (verses/sec) with and without debug output.
+
+Usage (from the top-level directory):
+    python -m benchmarks.identify [input_file ...] [--runs N] [--identifier_only]
+
+The input files (by default texts/gretil_stats/bharst_u.htm) are split into
+verses, which are identified once with debug output and once without: both by
+the identifier alone (on verses already read and scanned), and by the whole
+pipeline. The identifier is also timed finding only the best match for each
+verse, as the pipeline does, and the pipeline is also timed identifying all the
+verses as one batch, and identifying a few verses as they are typed in (one
+character at a time), afresh and with an EditSession.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import codecs
+import os.path
+import sys
+
+from benchmarks import BestTime
+from data import metrical_data
+import identifier_pipeline
+from print_utils import Print
+import read.read
+import read.split_gretil
+import scan
+from utils.utils import LruCache, Trace
+
+_DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'texts', 'gretil_stats', 'bharst_u.htm')
+
+
+def _Report(name, num_verses, seconds):
+  Print('%-35s %8.1f verses/sec  (%.3f s for %d verses)' % (
+      name, num_verses / seconds, seconds, num_verses))
+
+
+if __name__ == '__main__':
+  argument_parser = argparse.ArgumentParser(description=__doc__)
+  argument_parser.add_argument('input_files', nargs='*', default=[_DEFAULT_INPUT])
+  argument_parser.add_argument('--runs', type=int, default=5)
+  argument_parser.add_argument('--identifier_only', action='store_true',
+                               help='Skip timing the (much slower) whole pipeline.')
+  args = argument_parser.parse_args()
+
+  verses = []
+  for input_file in args.input_files:
+    verses.extend(read.split_gretil.split(codecs.open(input_file, 'r', 'utf-8').read())[0])
+  pipeline = identifier_pipeline.IdentifierPipeline()
+  identifier = pipeline.identifier
+  pattern_lines = [scan.ScanVerse(read.read.read_text(verse)[0]) for verse in verses]
+  pattern_lines = [lines for lines in pattern_lines if lines]
+  Print('%d verses in %s, %d metres known.' % (len(verses), ', '.join(args.input_files),
+                                              len(metrical_data.all_data)))
+
+  def IdentifyAll(debug, cache=None):
+    for lines in pattern_lines:
+      identifier.IdentifyFromPatternLines(lines, trace=Trace() if debug else None, cache=cache)
+
+  def BestMatchAll():
+    for lines in pattern_lines:
+      next(identifier.MatchesInPriorityOrder(lines), None)
+
+  def PipelineAll(debug):
+    for verse in verses:
+      pipeline.IdentifyFromText(verse, debug=debug)
+
+  _Report('Identifier, debug=True', len(pattern_lines),
+          BestTime(lambda: IdentifyAll(True), args.runs))
+  _Report('Identifier, debug=False', len(pattern_lines),
+          BestTime(lambda: IdentifyAll(False), args.runs))
+  _Report('Identifier, debug=False, cached', len(pattern_lines),
+          BestTime(lambda: IdentifyAll(False, LruCache(100000)), args.runs))
+  _Report('Identifier, best match only', len(pattern_lines),
+          BestTime(BestMatchAll, args.runs))
+  if args.identifier_only:
+    sys.exit(0)
+  _Report('IdentifierPipeline, debug=True', len(verses),
+          BestTime(lambda: PipelineAll(True), args.runs))
+  _Report('IdentifierPipeline, debug=False', len(verses),
+          BestTime(lambda: PipelineAll(False), args.runs))
+  for debug in [True, False]:
+    caches = []
+
+    def Batch():
+      caches.append(LruCache(100000))
+      pipeline.IdentifyBatch(verses, debug, caches[-1])
+    _Report('IdentifyBatch, debug=%s' % debug, len(verses), BestTime(Batch, args.runs))
+    Print('    %s' % caches[-1].Stats())
+
+  # Each prefix of each of the first few verses, as if typed into the form.
+  edits = [verse[:n] for verse in verses[:20] for n in range(1, len(verse) + 1)]
+
+  def EditAll(session_for_verse):
+    session = None
+    for text in edits:
+      if session is None or len(text) == 1:
+        session = session_for_verse()
+      session.Update(text)
+
+  class _Afresh(object):
+    def Update(self, text):
+      return pipeline.IdentifyFromText(text, debug=False)
+  for (name, session_for_verse) in [
+      ('IdentifyFromText, each edit', _Afresh),
+      ('EditSession, each edit', lambda: identifier_pipeline.EditSession(pipeline))]:
+    seconds = BestTime(lambda: EditAll(session_for_verse), args.runs)
+    Print('%-35s %8.3f ms/edit  (%d edits)' % (name, seconds * 1000 / len(edits), len(edits)))
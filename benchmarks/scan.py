@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Compares scanning verses one at a time with scanning them all at once.
+
+Usage (from the top-level directory):
+    python -m benchmarks.scan [input_file ...] [--runs N]
+
+The input files (by default texts/gretil_stats/bharst_u.htm) are split into
+verses and read, and then scanned by scan.ScanVerse (one verse at a time) and by
+batch_scan.ScanVerses (all verses at once, with NumPy if it is installed).
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import codecs
+import os.path
+
+import batch_scan
+from benchmarks import BestTime
+from print_utils import Print
+import read.read
+import read.split_gretil
+import scan
+
+_DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'texts', 'gretil_stats', 'bharst_u.htm')
+
+
+if __name__ == '__main__':
+  argument_parser = argparse.ArgumentParser(description=__doc__)
+  argument_parser.add_argument('input_files', nargs='*', default=[_DEFAULT_INPUT])
+  argument_parser.add_argument('--runs', type=int, default=10)
+  args = argument_parser.parse_args()
+
+  verses = []
+  for input_file in args.input_files:
+    verses.extend(read.split_gretil.split(codecs.open(input_file, 'r', 'utf-8').read())[0])
+  verses = [read.read.read_text(verse)[0] for verse in verses]
+  Print('%d verses, %d lines. NumPy is %s.' % (
+      len(verses), sum(len(verse) for verse in verses),
+      'available' if batch_scan.numpy is not None else 'not available'))
+
+  assert batch_scan.ScanVerses(verses) == [[batch_scan.packed_pattern.Pack(pattern)
+                                            for pattern in scan.ScanVerse(verse)]
+                                           for verse in verses]
+  for (name, function) in [
+      ('scan.ScanVerse, each verse', lambda: [scan.ScanVerse(verse) for verse in verses]),
+      ('batch_scan.ScanVerses', lambda: batch_scan.ScanVerses(verses))]:
+    Print('%-30s %8.2f ms' % (name, BestTime(function, args.runs) * 1000))
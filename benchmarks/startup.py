@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Compares the cold-start time of building the metrical data vs loading the index.
+
+Usage (from the top-level directory):
+    python -m data.build_index [--include_dhaval_mishra]
+    python -m benchmarks.startup [--runs N]
+
+Each measurement is made in a fresh Python process, and covers importing
+metrical_data and getting its data structures ready.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import subprocess
+import sys
+
+from data import metrical_data
+from print_utils import Print
+
+_CHILD = '''
+import time
+start = time.time()
+from data import metrical_data
+%s
+assert metrical_data.known_full_patterns
+print(time.time() - start)
+'''
+
+_WAYS = [
+    ('InitializeData()', 'metrical_data.InitializeData()'),
+    ('InitializeData(include_dhaval_mishra=True)',
+     'metrical_data.InitializeData(include_dhaval_mishra=True)'),
+    ('LoadIndex()', 'assert metrical_data.LoadIndex()'),
+]
+
+
+def _TimeInFreshProcess(statement):
+  output = subprocess.check_output([sys.executable, '-c', _CHILD % statement])
+  return float(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+  argument_parser = argparse.ArgumentParser(description=__doc__)
+  argument_parser.add_argument('--runs', type=int, default=10)
+  args = argument_parser.parse_args()
+  if not metrical_data.LoadIndex():
+    Print('No up-to-date index at %s: run python -m data.build_index first.' %
+          metrical_data.DEFAULT_INDEX_FILE)
+    sys.exit(1)
+  for (name, statement) in _WAYS:
+    times = sorted(_TimeInFreshProcess(statement) for _ in range(args.runs))
+    Print('%-45s min %7.2f ms   median %7.2f ms' % (
+        name, times[0] * 1000, times[len(times) // 2] * 1000))
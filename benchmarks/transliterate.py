@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Measures transliteration speed (MB/sec) for each input scheme.
+
+Usage (from the top-level directory):
+    python -m benchmarks.transliterate [--megabytes N] [--runs N]
+
+For each scheme, a verse in that scheme is repeated to make an input of the
+given size (by default 1 MB, as UTF-8), which is transliterated to SLP1 with
+TransliterateFrom. It is also timed at a tenth of the size: the time should grow
+linearly with the size of the input.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+
+from benchmarks import BestTime
+from print_utils import Print
+from transliteration.detect import TRANSLITERATION_SCHEME
+from transliteration import transliterate
+
+_SAMPLES = [
+    ('HK', TRANSLITERATION_SCHEME.HK,
+     'karmaNyevAdhikAraste mA phaleSu kadAcana | mA karmaphalahetur bhUr mA te saGgo stvakarmaNi ||\n'),
+    ('IAST', TRANSLITERATION_SCHEME.IAST,
+     'karmaṇyevādhikāraste mā phaleṣu kadācana | mā karmaphalahetur bhūr mā te saṅgo stvakarmaṇi ||\n'),
+    ('ITRANS', TRANSLITERATION_SCHEME.ITRANS,
+     'karmaNyevaadhikaaraste maa phaleShu kadaachana | maa karmaphalahetur bhuur maa te sa~Ngo stvakarmaNi ||\n'),
+    ('Devanagari', TRANSLITERATION_SCHEME.Devanagari,
+     'कर्मण्येवाधिकारस्ते मा फलेषु कदाचन । मा कर्मफलहेतुर्भूर्मा ते सङ्गोऽस्त्वकर्मणि ॥\n'),
+    ('Kannada', TRANSLITERATION_SCHEME.Kannada,
+     'ಕರ್ಮಣ್ಯೇವಾಧಿಕಾರಸ್ತೇ ಮಾ ಫಲೇಷು ಕದಾಚನ । ಮಾ ಕರ್ಮಫಲಹೇತುರ್ಭೂರ್ಮಾ ತೇ ಸಙ್ಗೋಽಸ್ತ್ವಕರ್ಮಣಿ ॥\n'),
+    ('Telugu', TRANSLITERATION_SCHEME.Telugu,
+     'కర్మణ్యేవాధికారస్తే మా ఫలేషు కదాచన । మా కర్మఫలహేతుర్భూర్మా తే సఙ్గోఽస్త్వకర్మణి ॥\n'),
+    ('Malayalam', TRANSLITERATION_SCHEME.Malayalam,
+     'കര്മണ്യേവാധികാരസ്തേ മാ ഫലേഷു കദാചന । മാ കര്മഫലഹേതുര്ഭൂര്മാ തേ സങ്ഗോഽസ്ത്വകര്മണി ॥\n'),
+]
+
+
+def _Repeated(sample, num_bytes):
+  return sample * (num_bytes // len(sample.encode('utf-8')) + 1)
+
+
+if __name__ == '__main__':
+  argument_parser = argparse.ArgumentParser(description=__doc__)
+  argument_parser.add_argument('--megabytes', type=float, default=1)
+  argument_parser.add_argument('--runs', type=int, default=3)
+  args = argument_parser.parse_args()
+
+  num_bytes = int(args.megabytes * 1000000)
+  for (name, scheme, sample) in _SAMPLES:
+    times = []
+    for size in [num_bytes // 10, num_bytes]:
+      text = _Repeated(sample, size)
+      megabytes = len(text.encode('utf-8')) / 1000000
+      seconds = BestTime(lambda: transliterate.TransliterateFrom(text, scheme, ' -?\n'), args.runs)
+      times.append(seconds)
+    Print('%-12s %8.2f MB/sec  (%.3f s for %.2f MB; %.1fx the time for a tenth)' % (
+        name, megabytes / seconds, seconds, megabytes, times[1] / times[0]))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Builds the index files that metrical_data.LoadData and transliterate read at startup.
+
+Usage (from the top-level directory):
+    python -m data.build_index [--include_dhaval_mishra] [--output FILE]
+                               [--transliteration_output FILE]
+
+The index has to be rebuilt whenever the metrical data (or the code that builds
+it) changes; until then, LoadData ignores the stale index and builds the data
+structures itself. The same goes for the transliteration state machines.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+
+from data import metrical_data
+from print_utils import Print
+from transliteration import transliterate
+
+
+def get_args():
+  argument_parser = argparse.ArgumentParser(description='Precompile the known'
+                                            ' metres into an index file.')
+  argument_parser.add_argument('--output', type=unicode,
+                               default=metrical_data.DEFAULT_INDEX_FILE,
+                               help='Where to write the index')
+  argument_parser.add_argument('--transliteration_output', type=unicode,
+                               default=transliterate.DEFAULT_INDEX_FILE,
+                               help='Where to write the index of transliteration'
+                               ' state machines')
+  argument_parser.add_argument('--include_dhaval_mishra', action='store_true',
+                               help='Also include the large list of metres in'
+                               ' data/dhaval_mishra.py')
+  return argument_parser.parse_args()
+
+
+if __name__ == '__main__':
+  args = get_args()
+  metrical_data.InitializeData(include_dhaval_mishra=args.include_dhaval_mishra)
+  metrical_data.SaveIndex(args.output)
+  Print('Wrote %d full patterns, %d half patterns, %d pāda patterns to %s' % (
+      len(metrical_data.known_full_patterns), len(metrical_data.known_half_patterns),
+      len(metrical_data.known_pada_patterns), args.output))
+  transliterate.SaveIndex(args.transliteration_output)
+  Print('Wrote the transliteration state machines to %s' % args.transliteration_output)
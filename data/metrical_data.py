@@ -3,28 +3,42 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import itertools
+import hashlib
+import marshal
+import os.path
 import re
 import unicodedata
 
-import data.ganesh
-import data.curated
-import data.dhaval_mishra
-import data.dhaval_vrttaratnakara
+from identify.automaton import CombinedMatcher
+from identify.masked_patterns import MaskedPatterns
+from identify.matra import Gana, MatraCount
+from identify import packed_pattern
 from print_utils import Print
 
-known_full_patterns = {}
-known_full_regexes = []
+known_full_patterns = MaskedPatterns()
+known_full_automaton = CombinedMatcher()
 
-known_half_patterns = {}
-known_half_regexes = []
+known_half_patterns = MaskedPatterns()
+known_half_automaton = CombinedMatcher()
 
-known_pada_patterns = {}
-known_pada_regexes = []
+known_pada_patterns = MaskedPatterns()
+known_pada_automaton = CombinedMatcher()
 
 pattern_for_metre = {}
 all_data = {}
 
+# Metre name -> its name in IAST and Devanāgari, and its description in HTML, for display.
+display_names = {}
+html_descriptions = {}
+
+# Modules whose contents went into the data structures above.
+_source_modules = []
+
+# Bump this when the layout of the index file changes.
+_INDEX_FORMAT_VERSION = 6
+_TOP_LEVEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_FILE = os.path.join(_TOP_LEVEL_DIR, 'data', 'metrical_data.index')
+
 
 def GetPattern(metre):
   return pattern_for_metre.get(metre)
@@ -62,34 +76,46 @@ def _AddPatternForMetre(metre_name, pada_patterns):
   pattern_for_metre[metre_name] = pada_patterns
 
 
-def _AddFullPattern(full_pattern, metre_name):
-  if full_pattern in known_full_patterns:
+def _AddFullPattern(full_pattern, metre_name, free_positions=()):
+  existing = known_full_patterns.Matches(packed_pattern.Pack(full_pattern))
+  if existing:
     # TODO(shreevatsa): Figure out what exactly to do in this case
     Print('Error: full pattern already present')
     Print(metre_name)
     Print(full_pattern)
-    Print(known_full_patterns[full_pattern])
+    Print(existing)
     return False
-  assert full_pattern not in known_full_patterns
-  known_full_patterns[full_pattern] = {metre_name: True}
+  known_full_patterns.Add(full_pattern, {metre_name: True}, free_positions)
   return True
 
-def _AddHalfPattern(half_pattern, metre_name, which_halves):
-  known_half_patterns.setdefault(half_pattern, {}).setdefault(metre_name, set()).update(which_halves)
+def _AddHalfPattern(half_pattern, metre_name, which_halves, free_positions=()):
+  known_half_patterns.Add(half_pattern, {metre_name: which_halves}, free_positions)
 
-def _AddPadaPattern(pada_pattern, metre_name, which_padas):
-  known_pada_patterns.setdefault(pada_pattern, {}).setdefault(metre_name, set()).update(which_padas)
+def _AddPadaPattern(pada_pattern, metre_name, which_padas, free_positions=()):
+  known_pada_patterns.Add(pada_pattern, {metre_name: which_padas}, free_positions)
+
+def _LastPositions(patterns):
+  """Positions of the last syllable of each pattern, in their concatenation."""
+  positions = []
+  end = 0
+  for pattern in patterns:
+    end += len(pattern)
+    positions.append(end - 1)
+  return positions
 
 def _AddSamavrttaPattern(metre_name, each_pada_pattern):
   """Given a sama-vṛtta metre's pattern, add it to the data structures."""
   clean = _CleanUpPattern(each_pada_pattern)
+  if clean.endswith('L'):
+    Print('Not adding %s for now, as %s ends with laghu' % (metre_name, clean))
+    return
   assert re.match(r'^[LG]*G$', clean), (each_pada_pattern, metre_name)
   _AddPatternForMetre(metre_name, [clean] * 4)
 
-  patterns = [clean[:-1] + 'G', clean[:-1] + 'L']
-  for (a, b, c, d) in itertools.product(patterns, repeat=4): _AddFullPattern(a + b + c + d, metre_name)
-  for (a, b) in itertools.product(patterns, repeat=2): _AddHalfPattern(a + b, metre_name, {1, 2})
-  for a in patterns: _AddPadaPattern(a, metre_name, {1, 2, 3, 4})
+  # The last syllable of each pāda can be laghu or guru.
+  _AddFullPattern(clean * 4, metre_name, _LastPositions([clean] * 4))
+  _AddHalfPattern(clean * 2, metre_name, {1, 2}, _LastPositions([clean] * 2))
+  _AddPadaPattern(clean, metre_name, {1, 2, 3, 4}, _LastPositions([clean]))
 
 
 def _AddArdhasamavrttaPattern(metre_name, odd_and_even_pada_patterns):
@@ -104,12 +130,13 @@ def _AddArdhasamavrttaPattern(metre_name, odd_and_even_pada_patterns):
   assert re.match(r'^[LG]*G$', clean_even), (metre_name, clean_even)
   _AddPatternForMetre(metre_name, [clean_odd, clean_even] * 2)
 
-  patterns_odd = [clean_odd[:-1] + 'G', clean_odd[:-1] + 'L']
-  patterns_even = [clean_even[:-1] + 'G', clean_even[:-1] + 'L']
-  for (a, b, c, d) in itertools.product(patterns_odd, patterns_even, repeat=2): _AddFullPattern(a + b + c + d, metre_name)
-  for (a, b) in itertools.product(patterns_odd, patterns_even): _AddHalfPattern(a + b, metre_name, {1, 2})
-  for a in patterns_odd: _AddPadaPattern(a, metre_name, {1, 3})
-  for b in patterns_even: _AddPadaPattern(b, metre_name, {2, 4})
+  # The last syllable of each pāda can be laghu or guru.
+  _AddFullPattern((clean_odd + clean_even) * 2, metre_name,
+                  _LastPositions([clean_odd, clean_even] * 2))
+  _AddHalfPattern(clean_odd + clean_even, metre_name, {1, 2},
+                  _LastPositions([clean_odd, clean_even]))
+  _AddPadaPattern(clean_odd, metre_name, {1, 3}, _LastPositions([clean_odd]))
+  _AddPadaPattern(clean_even, metre_name, {2, 4}, _LastPositions([clean_even]))
 
 
 def _AddVishamavrttaPattern(metre_name, pada_patterns):
@@ -118,33 +145,34 @@ def _AddVishamavrttaPattern(metre_name, pada_patterns):
   pada_patterns = [_CleanUpPattern(p) for p in pada_patterns]
   for p in pada_patterns: assert re.match(r'^[LG]*$', p)
   (pa, pb, pc, pd) = pada_patterns
+  if pb.endswith('L') or pd.endswith('L'):
+    Print('Not adding %s for now, as an even pāda ends with laghu' % metre_name)
+    return
   assert pb.endswith('G')
   assert pd.endswith('G')
   _AddPatternForMetre(metre_name, [pa, pb, pc, pd])
 
-  patterns_a = [pa]
-  patterns_b = [pb[:-1] + 'G', pb[:-1] + 'L']
-  patterns_c = [pc]
-  patterns_d = [pd[:-1] + 'G', pd[:-1] + 'L']
-  for (a, b, c, d) in itertools.product(patterns_a, patterns_b, patterns_c, patterns_d): _AddFullPattern(a + b + c + d, metre_name)
-  for (a, b) in itertools.product(patterns_a, patterns_b): _AddHalfPattern(a + b, metre_name, {1})
-  for (c, d) in itertools.product(patterns_c, patterns_d): _AddHalfPattern(c + d, metre_name, {2})
-  for a in patterns_a: _AddPadaPattern(a, metre_name, {1})
-  for b in patterns_b: _AddPadaPattern(b, metre_name, {2})
-  for c in patterns_c: _AddPadaPattern(c, metre_name, {3})
-  for d in patterns_d: _AddPadaPattern(d, metre_name, {4})
+  # The last syllable of each even pāda can be laghu or guru.
+  (_, end_b, _, end_d) = _LastPositions([pa, pb, pc, pd])
+  _AddFullPattern(pa + pb + pc + pd, metre_name, [end_b, end_d])
+  _AddHalfPattern(pa + pb, metre_name, {1}, _LastPositions([pa + pb]))
+  _AddHalfPattern(pc + pd, metre_name, {2}, _LastPositions([pc + pd]))
+  _AddPadaPattern(pa, metre_name, {1})
+  _AddPadaPattern(pb, metre_name, {2}, _LastPositions([pb]))
+  _AddPadaPattern(pc, metre_name, {3})
+  _AddPadaPattern(pd, metre_name, {4}, _LastPositions([pd]))
 
 
 def _AddFullRegex(full_verse_regex, metre_name):
-  known_full_regexes.append((re.compile('^' + full_verse_regex + '$'), {metre_name : True}))
+  known_full_automaton.Add(full_verse_regex, {metre_name: True})
 
 
 def _AddHalfRegex(half_verse_regex, metre_name, which_halves):
-  known_half_regexes.append((re.compile('^' + half_verse_regex + '$'), {metre_name: which_halves}))
+  known_half_automaton.Add(half_verse_regex, {metre_name: which_halves})
 
 
 def _AddPadaRegex(pada_regex, metre_name, which_padas):
-  known_pada_regexes.append((re.compile('^' + pada_regex + '$'), {metre_name: which_padas}))
+  known_pada_automaton.Add(pada_regex, {metre_name: which_padas})
 
 
 def _AddSamavrttaRegex(metre_name, pada_regex):
@@ -200,57 +228,29 @@ def _AddAnustupExamples():
                  ['........', '....LGL.', '........', '....LGL.'])
 
 
-def _MatraCount(pattern):
-  assert re.match('^[LG]*$', pattern)
-  return sum(2 if c == 'G' else 1 for c in pattern)
-
-
-def _PatternsOfLength(n):
-  if n in _patterns_memo:
-    return _patterns_memo[n]
-  _patterns_memo[n] = [p + 'L' for p in _PatternsOfLength(n - 1)]
-  _patterns_memo[n] += [p + 'G' for p in _PatternsOfLength(n - 2)]
-  return _patterns_memo[n]
-_patterns_memo = {0: [''], 1: ['L']}
-
-
-def _LoosePatternsOfLength(n):
-  if n in _loose_patterns_memo:
-    return _loose_patterns_memo[n]
-  _loose_patterns_memo[n] = (_PatternsOfLength(n) +
-                             [p for p in _PatternsOfLength(n - 1)
-                              if p.endswith('L')])
-  return _loose_patterns_memo[n]
-_loose_patterns_memo = {0: [''], 1: ['L']}
-
-
-def _AddAryaFamilyRegex():
-  """Add regexes for the Āryā family of metres."""
-  odd_ganas = ['GG', 'LLG', 'GLL', 'LLLL']
-  even_ganas = odd_ganas + ['LGL']
-  odd_gana_re = '(%s)' % '|'.join(odd_ganas)
-  even_gana_re = '(%s)' % '|'.join(even_ganas)
-  pada_12_re = odd_gana_re + even_gana_re + odd_gana_re
-  pada_15_re = even_gana_re + odd_gana_re + 'L' + odd_gana_re + '(L|G)'
-  pada_18_re = even_gana_re + odd_gana_re + '(LLLL|LGL)' + odd_gana_re + '(L|G)'
-  pada_20_re = (even_gana_re + odd_gana_re + '(LLLL|LGL)' + odd_gana_re +
-                '(%s)' % '|'.join(even_ganas + ['GL', 'LLL']))
-  _AddMetreRegex('Āryā',
-                 [pada_12_re, pada_18_re, pada_12_re, pada_15_re], simple=False)
-  _AddMetreRegex('Gīti',
-                 [pada_12_re, pada_18_re, pada_12_re, pada_18_re], simple=False)
-  _AddMetreRegex('Upagīti',
-                 [pada_12_re, pada_15_re, pada_12_re, pada_15_re], simple=False)
-  _AddMetreRegex('Udgīti',
-                 [pada_12_re, pada_15_re, pada_12_re, pada_18_re], simple=False)
-  _AddMetreRegex('Āryāgīti',
-                 [pada_12_re, pada_20_re, pada_12_re, pada_20_re], simple=False)
-  _AddMetreRegex('Āryā (loose schema)',
-                 ['|'.join(_LoosePatternsOfLength(12)),
-                  '|'.join(_LoosePatternsOfLength(18)),
-                  '|'.join(_LoosePatternsOfLength(12)),
-                  '|'.join(_LoosePatternsOfLength(15))],
-                 simple=False)
+def _AddJatiMetre(metre_name, pada_ganas):
+  """Given the gaṇa-s of each of the four pādas of a mātrā-vṛtta, add it."""
+  assert len(pada_ganas) == 4, (metre_name, pada_ganas)
+  known_full_automaton.AddJati(pada_ganas, {metre_name: True})
+
+
+def _AddAryaFamily():
+  """Add the Āryā family of metres."""
+  odd_gana = Gana(4, forbidden=['LGL'])
+  even_gana = Gana(4)
+  sixth_gana = Gana(4, allowed=['LLLL', 'LGL'])
+  final_syllable = Gana(2, allowed=['G'], loose_end=True)
+  pada_12 = [odd_gana, even_gana, odd_gana]
+  pada_15 = [even_gana, odd_gana, Gana(1), odd_gana, final_syllable]
+  pada_18 = [even_gana, odd_gana, sixth_gana, odd_gana, final_syllable]
+  pada_20 = [even_gana, odd_gana, sixth_gana, odd_gana, Gana(4, loose_end=True)]
+  _AddJatiMetre('Āryā', [pada_12, pada_18, pada_12, pada_15])
+  _AddJatiMetre('Gīti', [pada_12, pada_18, pada_12, pada_18])
+  _AddJatiMetre('Upagīti', [pada_12, pada_15, pada_12, pada_15])
+  _AddJatiMetre('Udgīti', [pada_12, pada_15, pada_12, pada_18])
+  _AddJatiMetre('Āryāgīti', [pada_12, pada_20, pada_12, pada_20])
+  _AddJatiMetre('Āryā (loose schema)',
+                [[Gana(matras, loose_end=True)] for matras in [12, 18, 12, 15]])
 
 
 def _AddGiti(pada_patterns):
@@ -262,7 +262,7 @@ def _AddGiti(pada_patterns):
     if i % 2 and pada_patterns[i].endswith('L'):
       allow_loose_ending = True
       expected[i] -= 1
-    assert _MatraCount(pada_patterns[i]) == expected[i], (i, pada_patterns[i], _MatraCount(pada_patterns[i]), expected[i])
+    assert MatraCount(pada_patterns[i]) == expected[i], (i, pada_patterns[i], MatraCount(pada_patterns[i]), expected[i])
     if allow_loose_ending:
       pada_patterns[i] = pada_patterns[i][:-1] + '.'
   # TODO(shreevatsa): Should we just add (up to) 4 patterns instead?
@@ -357,22 +357,33 @@ def _AddKarambajati():
   #                'L G L G G L L G L G L G'])
 
 
-def InitializeData():
+def InitializeData(include_dhaval_mishra=False):
   """Add all known metres to the data structures."""
+  # Imported only here, so that LoadIndex does not pay for importing them.
+  import data.ganesh
+  import data.curated
+  import data.dhaval_mishra
+  import data.dhaval_vrttaratnakara
+
   _AddAnustup()
   _AddAnustupExamples()
 
-  _AddAryaFamilyRegex()
+  _AddAryaFamily()
   _AddKarambajati()
 
   vrtta_data = (data.ganesh.data
                 + data.curated.curated_vrtta_data
-                + data.dhaval_vrttaratnakara.data_vrttaratnakara
-                # + data.dhaval.dhaval_vrtta_data
-                )
+                + data.dhaval_vrttaratnakara.data_vrttaratnakara)
+  _source_modules.extend(['data.ganesh', 'data.curated', 'data.dhaval_vrttaratnakara'])
+  if include_dhaval_mishra:
+    vrtta_data += data.dhaval_mishra.dhaval_vrtta_data
+    _source_modules.append('data.dhaval_mishra')
 
   assert not all_data
   for (name, description) in vrtta_data:
+    if name in all_data:
+      # Print('Not adding duplicate as already present: %s' % name)
+      continue
     samatva = None
     regex_or_pattern = None
     if isinstance(description, list):
@@ -401,8 +412,111 @@ def InitializeData():
     else:
       assert False, name
 
+  _AddDisplayNames()
+
+
+def _MetreNames():
+  """The names of all metres in the data structures."""
+  names = set(all_data) | set(pattern_for_metre)
+  for automaton in [known_full_automaton, known_half_automaton, known_pada_automaton]:
+    for value in automaton.Values():
+      names.update(value)
+  return names
+
+
+def _AddDisplayNames():
+  """Fills display_names and html_descriptions for every metre."""
+  # Imported only here, like the data above.
+  from transliteration import transliterate
+  for name in _MetreNames():
+    display_names[name] = transliterate.AddDevanagariToIast(name)
+    html_descriptions[name] = _HtmlDescription(name)
+
+
+def _SourceFingerprint(module_names):
+  """A hash of the source code that the data structures are built from."""
+  # The transliteration modules make the display names.
+  module_names = ['data.metrical_data', 'identify.automaton', 'identify.masked_patterns',
+                  'identify.matra', 'identify.packed_pattern', 'slp1',
+                  'transliteration.devanagari', 'transliteration.transliterate',
+                  'transliteration.transliterator'] + module_names
+  digest = hashlib.sha1()
+  for module_name in module_names:
+    module_file = os.path.join(_TOP_LEVEL_DIR, *module_name.split('.')) + '.py'
+    with open(module_file, 'rb') as source:
+      digest.update(source.read())
+  return digest.hexdigest()
+
+
+def SaveIndex(index_file=DEFAULT_INDEX_FILE):
+  """Writes the (initialized) data structures to a file, for LoadIndex."""
+  assert all_data, 'InitializeData() first'
+  header = (_INDEX_FORMAT_VERSION, list(_source_modules),
+            _SourceFingerprint(_source_modules))
+  body = (known_full_patterns.ToData(), known_half_patterns.ToData(),
+          known_pada_patterns.ToData(), known_full_automaton.ToData(),
+          known_half_automaton.ToData(), known_pada_automaton.ToData(), pattern_for_metre,
+          all_data, display_names, html_descriptions)
+  with open(index_file, 'wb') as index:
+    marshal.dump(header, index)
+    marshal.dump(body, index)
+
+
+def LoadIndex(index_file=DEFAULT_INDEX_FILE):
+  """Fills the data structures from a file written by SaveIndex.
+
+  Returns False (leaving the data structures untouched) if there is no such
+  file, or if it is from an older version of the code or data.
+  """
+  assert not all_data
+  try:
+    with open(index_file, 'rb') as index:
+      (version, module_names, fingerprint) = marshal.load(index)
+      if version != _INDEX_FORMAT_VERSION:
+        return False
+      if fingerprint != _SourceFingerprint(module_names):
+        return False
+      body = marshal.load(index)
+  except (IOError, EOFError, ValueError, TypeError):
+    return False
+  (full_patterns, half_patterns, pada_patterns, full_automaton, half_automaton,
+   pada_automaton, patterns_for_metres, descriptions, names_for_display, descriptions_in_html) = body
+  known_full_patterns.FromData(full_patterns)
+  known_half_patterns.FromData(half_patterns)
+  known_pada_patterns.FromData(pada_patterns)
+  known_full_automaton.FromData(full_automaton)
+  known_half_automaton.FromData(half_automaton)
+  known_pada_automaton.FromData(pada_automaton)
+  pattern_for_metre.update(patterns_for_metres)
+  all_data.update(descriptions)
+  display_names.update(names_for_display)
+  html_descriptions.update(descriptions_in_html)
+  _source_modules.extend(module_names)
+  return True
+
+
+def LoadData(index_file=DEFAULT_INDEX_FILE):
+  """Loads the data structures from the index file if possible, else builds them."""
+  if not LoadIndex(index_file):
+    InitializeData()
+
+
+def DisplayName(name):
+  """The name of the metre in IAST, followed by its Devanāgari in brackets."""
+  if name in display_names:
+    return display_names[name]
+  from transliteration import transliterate
+  return transliterate.AddDevanagariToIast(name)
+
 
 def HtmlDescription(name):
+  """A description of the metre, in HTML."""
+  if name in html_descriptions:
+    return html_descriptions[name]
+  return _HtmlDescription(name)
+
+
+def _HtmlDescription(name):
   if name not in all_data:
     return '[No description currently for %s]' % name
   (samatva, regex_or_pattern, description) = all_data[name]
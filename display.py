@@ -2,14 +2,18 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import slp1
 from transliteration import transliterate
 
 _GAP_CHAR = '-'
 
 
-def _Align(s, t):
-  """Find best alignment of strings s and t."""
+def _Align(s, t, cache=None):
+  """Find best alignment of strings s and t.
+
+  If a utils.LruCache is given, the rows of the table for the longest prefix of
+  s that was aligned to t before are taken from it, and only the rest of the
+  table is filled in (useful when s is being edited).
+  """
   m = len(s)
   n = len(t)
   addition_cost = 1           # Cost of adding an extra character in s
@@ -18,14 +22,28 @@ def _Align(s, t):
     """Cost of characters in s and t not matching."""
     return 0 if s[i - 1] == t[j - 1] else 1
   max_cost = m * n + 1
-  best = [[max_cost] * (n + 1) for _ in range(m + 1)]
-  best[0][0] = 0
-  for i in range(m + 1):
+  # best[i][j] is the cost of aligning s[:i] with t[:j]; it depends only on
+  # those, so each row can be filled in (or reused) after the ones before it.
+  best = []
+  previous = cache.Get(t) if cache is not None else None
+  if previous is not None:
+    (previous_s, previous_best) = previous
+    common = 0
+    while common < min(m, len(previous_s)) and s[common] == previous_s[common]:
+      common += 1
+    best = previous_best[:common + 1]
+  for i in range(len(best), m + 1):
+    row = [max_cost] * (n + 1)
+    if i == 0:
+      row[0] = 0
     for j in range(n + 1):
-      if i > 0: best[i][j] = min(best[i][j], best[i-1][j] + addition_cost)
-      if j > 0: best[i][j] = min(best[i][j], best[i][j-1] + deletion_cost)
+      if i > 0: row[j] = min(row[j], best[i-1][j] + addition_cost)
+      if j > 0: row[j] = min(row[j], row[j-1] + deletion_cost)
       if i > 0 and j > 0:
-        best[i][j] = min(best[i][j], best[i-1][j-1] + MismatchCost(i, j))
+        row[j] = min(row[j], best[i-1][j-1] + MismatchCost(i, j))
+    best.append(row)
+  if cache is not None:
+    cache.Put(t, (s, best))
   for j in range(1, n + 1):
     assert best[0][j] == deletion_cost * j
   for i in range(1, m + 1):
@@ -58,53 +76,42 @@ def _Align(s, t):
   return (aligned_s, aligned_t)
 
 
-def _SyllabizeVisual(text):
-  """Break given text into syllables."""
-  syllables = []
-  # Everything until the first vowel is the first syllable
-  i = 0
-  while True:
-    syllable = ''
-    if i == len(text): break
-    while i < len(text):
-      c = text[i]
-      i += 1
-      syllable += c
-      if c in slp1.VOWELS:
-        # Peek ahead to capture all groups until the next vowel
-        groups = []
-        group = ''
-        j = i
-        while j < len(text):
-          c = text[j]
-          group += c
-          j += 1
-          if c in slp1.VOWELS:
-            # This group has a vowel, and shouldn't be consumed
-            break
-          if j == len(text) or c not in slp1.ALPHABET:
-            groups.append(group)
-            group = ''
-        to_add = ''.join(groups)
-        syllable += to_add
-        i += len(to_add)
-        syllables.append(syllable)
-        syllable = ''
-  assert ''.join(syllables) == text, (syllables, text)
-  return syllables
+def _SyllablesFromSpans(display_verse, spans):
+  """The text of each syllable, given spans (line, start, end) from scan.ScanVerse.
+
+  With the lines joined by spaces, each syllable runs from the start of its span
+  to the start of the next one, so that nothing is left out: the first syllable
+  also takes whatever is before it, and the last of a line whatever is after it
+  (including the line break and any line without vowels).
+  """
+  text = ' '.join(display_verse)
+  line_offsets = []
+  offset = 0
+  for line in display_verse:
+    line_offsets.append(offset)
+    offset += len(line) + 1
+  starts = [line_offsets[line] + start for (line, start, _) in spans]
+  if starts:
+    starts[0] = 0
+  ends = starts[1:] + [len(text)]
+  return [text[start:end] for (start, end) in zip(starts, ends)]
+
 
+def AlignVerseToMetre(display_verse, verse_pattern, syllable_spans, metre_pattern_lines,
+                      cache=None):
+  """Match syllables of verse with those of metre.
 
-# Take verse_pattern too, because of additional display chars in display_verse
-def AlignVerseToMetre(display_verse, verse_pattern, metre_pattern_lines):
-  """Match syllables of verse with those of metre."""
+  verse_pattern and syllable_spans are as from scan.ScanVerse(display_verse, with_spans=True).
+  cache (a utils.LruCache) is as for _Align.
+  """
   if not verse_pattern:
     return
   metre_pattern = ''.join(metre_pattern_lines)
-  (aligned_v, aligned_m) = _Align(verse_pattern, metre_pattern)
+  (aligned_v, aligned_m) = _Align(verse_pattern, metre_pattern, cache)
   assert len(aligned_v) == len(aligned_m)
   assert len(aligned_v) >= len(verse_pattern)
   assert len(aligned_m) >= len(metre_pattern)
-  syllables = _SyllabizeVisual(' '.join(display_verse))
+  syllables = _SyllablesFromSpans(display_verse, syllable_spans)
   assert len(syllables) == len(verse_pattern)
 
   n = len(aligned_m)
@@ -7,6 +7,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import unittest
 
 import display
+import scan
 
 
 class KnownValues(unittest.TestCase):
@@ -23,6 +24,13 @@ class KnownValues(unittest.TestCase):
     self.assertEqual(display._Align('abcdabcd', 'abcd'),
                      ('abcdabcd', 'abcd----'))
 
+  def testSyllablesFromSpans(self):
+    lines = ['rAma- lakzmaRO', 'hy agacCatAm']
+    (patterns, spans) = scan.ScanVerse(lines, with_spans=True)
+    self.assertEqual(patterns, ['GLGLG', 'LGLG'])
+    self.assertEqual(display._SyllablesFromSpans(lines, spans),
+                     ['rA', 'ma- ', 'la', 'kzma', 'RO hy ', 'a', 'ga', 'cCa', 'tAm'])
+
 
 if __name__ == '__main__':
   unittest.main()
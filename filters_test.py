@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the rules that clean up verses of GRETIL files."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import Counter
+import unittest
+
+import read.filters
+
+
+class CleanVerse(unittest.TestCase):
+
+  # Name of each rejection rule -> a verse (as split at <BR> lines) that it rejects.
+  REJECTED = [
+      ('is_parenthesized_line', '(a)<BR>\n(b)<BR>'),
+      ('is_empty', '***<BR>'),
+      ('is_header_line', 'Main Text<BR>'),
+      ('is_footnote_line', '\\footnote{a}<BR>'),
+      ('is_asterisked_variant_line', '*a<BR>\nb<BR>'),
+      ('is_footnote_followed_by_variant_line',
+       '\\footnote{a}<BR>\nnāryo mugdhaśaṭhā haranti ramaṇaṃ tiṣṭhanti no vāritās<BR>'),
+      ('is_html_footer_line', '</font></body></html>'),
+      ('is_verses_found_elsewhere_line', 'Verses found in a not found here<BR>'),
+      ('is_edition_info', 'This edition is based on a<BR>'),
+      ('is_text_abbreviation_header', 'Text<BR>\nAbbreviations <BR>'),
+      ('is_parentheses_info', 'The parentheses in between verses contain a<BR>'),
+      ('is_trailing_work_name_junk',
+       'amaruśatakam}<BR>\nāmaruśatakam<BR>\namarukaviracitam}<BR>\nāmarukaviracitam}}<BR>'),
+      ('is_section_header_line', '[a]<BR>'),
+      ('is_work_footer_line', 'iti śubhaṃ bhūyāt |<BR>'),
+      ('is_work_header_line', 'Bhallaṭaśataka<BR>'),
+      ('is_abbreviation_block', 'su. = subhāṣitaratnakoṣa, <BR>\nśā. = śārṅgadharapaddhati<BR>'),
+  ]
+
+  def testRejectedBy(self):
+    """Each verse should be rejected by its rule, and counted in the stats."""
+    self.assertEqual([name for (name, _) in self.REJECTED],
+                     [rule.__name__ for rule in read.filters.VERSE_REJECTIONS])
+    stats = read.filters.FilterStats()
+    for (name, verse) in self.REJECTED:
+      self.assertEqual([rejected_by for (_, rejected_by, _) in read.filters.clean_verse(verse, stats)],
+                       [name])
+    kept = list(read.filters.clean_verse('kazcit kAntA<BR>\nvirahaguruRA<BR>\n(a)<BR>', stats))
+    self.assertEqual(kept, [('kazcit kAntA<BR>\nvirahaguruRA<BR>', None, (0, 2))])
+    expected = Counter(name for (name, _) in self.REJECTED)
+    # The verse kept, and the first one rejected, lose a trailing parenthesized line.
+    expected['remove_trailing_parenthesized_line'] += 2
+    self.assertEqual(stats.hits, expected)
+    self.assertEqual(len(stats.lines()),
+                     len(read.filters.VERSE_REWRITES + read.filters.VERSE_REJECTIONS +
+                         read.filters.FINAL_REWRITES))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,7 +1,9 @@
+# -*- coding: utf-8 -*-
 """A unified interface to reader + scanner + metrical_data + identifier."""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
 import logging
 
 from data import metrical_data
@@ -9,63 +11,185 @@ import display
 from identify import identifier
 from read import read
 import scan
-from utils.utils import call_with_log_capture
+from utils.utils import LruCache, Trace
+
+# Enough for the distinct parts of a long text; each entry is small.
+_BATCH_CACHE_SIZE = 100000
+# Enough for the parts (and lines) of the versions of a verse being edited.
+_SESSION_CACHE_SIZE = 1000
+# Alignments are kept for the last few metres matched; each is a large table.
+_SESSION_ALIGN_CACHE_SIZE = 4
+
+
+class IdentificationResult(collections.namedtuple('IdentificationResult', [
+    'full_match',      # Whether the verse exactly matched a known metre.
+    'results',         # Tuple of metre names, or None if the verse has no syllables.
+    'tables',          # Tuple of (metre name, HTML table of the verse aligned to it).
+    'pattern_lines',   # Tuple of scanned lines (strings over {'L', 'G'}).
+    'debug_read',      # Debug output from reading the input, or None without debug.
+    'debug_identify',  # Tuple of lines of debug output from the identifier.
+])):
+  """The (immutable) result of a single IdentifyFromText call."""
+
+  def DebugRead(self):
+    return self.debug_read or ''
+
+  def DebugScan(self):
+    return '\n'.join(self.pattern_lines)
+
+  def DebugIdentify(self):
+    return '\n'.join(self.debug_identify)
+
+  def AllDebugOutput(self):
+    return '\n'.join([self.DebugRead(), self.DebugIdentify()])
 
 
 class IdentifierPipeline(object):
-  """A single interface to read-scan-data-identify-display."""
+  """A single interface to read-scan-data-identify-display.
+
+  Each call returns its own IdentificationResult and nothing is stored on the
+  pipeline, so one pipeline (and the metrical data it loaded) can serve many
+  threads at once.
+  """
 
   def __init__(self):
     """Initialize whichever of the parts need it."""
     if not metrical_data.known_full_patterns:
-      metrical_data.InitializeData()
+      metrical_data.LoadData()
     self.identifier = identifier.Identifier(metrical_data)
 
-  def _Reset(self):
-    self.debug_read = None
-    self.debug_identify = []
-    self.pattern_lines = []
-    self.tables = []
-
-  def IdentifyFromLines(self, input_lines):
+  def IdentifyFromLines(self, input_lines, debug=True):
     """Given lines of verse, read-scan-identify-display"""
-    return self.IdentifyFromText('\n'.join(input_lines))
+    return self.IdentifyFromText('\n'.join(input_lines), debug)
+
+  def IdentifyFromText(self, input_text, debug=True):
+    """Given text of verse, read-scan-identify-display. Returns an IdentificationResult.
 
-  def IdentifyFromText(self, input_text):
-    """Given text of verse, read-scan-identify-display."""
-    self._Reset()
+    Debug output is collected only if debug is True.
+    """
+    return self._Identify(input_text, debug, None, None)
+
+  def IdentifyBatch(self, verses, debug=False, cache=None):
+    """Like IdentifyFromText for each of verses; returns the results in the same order.
+
+    Verses with the same pattern lines are identified only once, and lookups of
+    parts (halves, pāda-s, ...) are shared across the batch through cache, a
+    utils.LruCache (by default, a new one). Its hits and misses are logged.
+    """
+    if cache is None:
+      cache = LruCache(_BATCH_CACHE_SIZE)
+    identified = {}
+    results = [self._Identify(verse, debug, cache, identified) for verse in verses]
+    logging.info('Identified %d verses, with %d distinct scans; %s',
+                 len(verses), len(identified), cache.Stats())
+    return results
+
+  def _Identify(self, input_text, debug, cache, identified):
+    """IdentifyFromText, with identified (if not None) mapping pattern lines to (best match, debug output)."""
     logging.info('Got input:\n%s', input_text)
-    ((cleaned_lines, display_lines), self.debug_read) = call_with_log_capture(read.read_text, input_text)
-    pattern_lines = scan.ScanVerse(cleaned_lines)
-    self.pattern_lines = pattern_lines
+    read_trace = Trace() if debug else None
+    (_, display_lines) = read.read_text(input_text, read_trace)
+    debug_read = read_trace.Text() if debug else None
+    # The same patterns as for the cleaned lines, and where the syllables are as displayed.
+    (pattern_lines, syllable_spans) = scan.ScanVerse(display_lines, with_spans=True)
+    pattern_lines = tuple(pattern_lines)
     if not pattern_lines:
-      return None
-
-    results = self.identifier.IdentifyFromPatternLines(pattern_lines)
-    self.debug_identify = (['Global:'] + self.identifier.global_debug +
-                           ['Parts:'] + self.identifier.parts_debug)
-    new_results = []
-    if results:
-      for m in list(results.get('exact', [])) + list(results.get('partial', [])) + list(results.get('accidental', [])):
-        known_pattern = metrical_data.GetPattern(m)
-        if known_pattern:
-          alignment = display.AlignVerseToMetre(display_lines,
-                                                ''.join(pattern_lines),
-                                                known_pattern)
-          table = display.HtmlTableFromAlignment(alignment)
-          self.tables.append((m, table))
-        new_results.append(m)
-        break
-    return ('exact' in results, new_results)
+      return IdentificationResult(full_match=False, results=None, tables=(),
+                                  pattern_lines=pattern_lines,
+                                  debug_read=debug_read, debug_identify=())
 
-  def DebugRead(self):
-    return self.debug_read or ''
+    if identified is not None and pattern_lines in identified:
+      (best, debug_identify) = identified[pattern_lines]
+    else:
+      (best, debug_identify) = self._BestMatch(pattern_lines, debug, cache)
+      if identified is not None:
+        identified[pattern_lines] = (best, debug_identify)
+    return _Result(best, display_lines, pattern_lines, syllable_spans, debug_read, debug_identify)
 
-  def DebugScan(self):
-      return '\n'.join(self.pattern_lines)
+  def _BestMatch(self, pattern_lines, debug, cache):
+    """The first (match_type, metre_name) in priority order (or None), and the debug output."""
+    identify_trace = Trace() if debug else None
+    matches = self.identifier.MatchesInPriorityOrder(pattern_lines, trace=identify_trace,
+                                                     cache=cache)
+    # Only the best match is used.
+    best = next(matches, None)
+    if debug:
+      # Try all the parts anyway, for the debug output.
+      for _ in matches:
+        pass
+    return (best, identify_trace.Lines() if debug else ())
 
-  def DebugIdentify(self):
-    return '\n'.join(self.debug_identify)
 
-  def AllDebugOutput(self):
-    return '\n'.join([self.DebugRead(), self.DebugIdentify()])
+class EditSession(object):
+  """Identifies a verse again and again as it is edited, redoing only what changed.
+
+  Each Update takes the whole text (as the web form sends it). Lines that did
+  not change are not read or scanned again (see scan.IncrementalScan), and the
+  lookups of parts (halves, pāda-s, ...) whose patterns did not change are
+  answered from a cache. If the patterns did not change, neither does the
+  match, and the table is made again only if the displayed lines changed; when
+  it is, the alignment of the syllables before the first change is reused.
+
+  A session is for a single verse being edited; it is not thread-safe.
+  """
+
+  def __init__(self, pipeline):
+    self._pipeline = pipeline
+    self._read_cache = LruCache(_SESSION_CACHE_SIZE)
+    self._identify_cache = LruCache(_SESSION_CACHE_SIZE)
+    self._align_cache = LruCache(_SESSION_ALIGN_CACHE_SIZE)
+    self._scan = scan.IncrementalScan()
+    self._text = None
+    self._best = None
+    self._result = None
+    # The lines whose patterns changed in the last Update.
+    self.changed_lines = []
+
+  def Update(self, input_text):
+    """The IdentificationResult (without debug output) for the new text of the verse."""
+    if input_text == self._text:
+      self.changed_lines = []
+      return self._result
+    (_, display_lines) = read.read_text(input_text, line_cache=self._read_cache)
+    old_pattern_lines = tuple(self._scan.patterns)
+    old_display_lines = self._scan.lines
+    self.changed_lines = self._scan.Update(display_lines)
+    pattern_lines = tuple(self._scan.patterns)
+    if not pattern_lines:
+      result = IdentificationResult(full_match=False, results=None, tables=(),
+                                    pattern_lines=pattern_lines,
+                                    debug_read=None, debug_identify=())
+    elif self._result is not None and self._result.results is not None and (
+        display_lines == old_display_lines):
+      result = self._result
+    else:
+      if self._result is None or pattern_lines != old_pattern_lines:
+        (self._best, _) = self._pipeline._BestMatch(pattern_lines, False, self._identify_cache)
+      result = _Result(self._best, display_lines, pattern_lines, self._scan.Spans(), None, (),
+                       self._align_cache)
+    self._text = input_text
+    self._result = result
+    return result
+
+
+def _Result(best, display_lines, pattern_lines, syllable_spans, debug_read, debug_identify,
+            align_cache=None):
+  """The IdentificationResult for the best match (or None), with its table."""
+  tables = []
+  new_results = []
+  if best:
+    (match_type, m) = best
+    known_pattern = metrical_data.GetPattern(m)
+    if known_pattern:
+      alignment = display.AlignVerseToMetre(display_lines,
+                                            ''.join(pattern_lines),
+                                            syllable_spans,
+                                            known_pattern,
+                                            align_cache)
+      table = display.HtmlTableFromAlignment(alignment)
+      tables.append((m, table))
+    new_results.append(m)
+  full_match = best is not None and best[0] == 'exact'
+  return IdentificationResult(full_match=full_match, results=tuple(new_results),
+                              tables=tuple(tables), pattern_lines=pattern_lines,
+                              debug_read=debug_read, debug_identify=debug_identify)
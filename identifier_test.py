@@ -4,9 +4,11 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import threading
 import unittest
 
 import identifier_pipeline
+from utils.utils import LruCache, Trace
 
 
 class BadInput(unittest.TestCase):
@@ -17,14 +19,14 @@ class BadInput(unittest.TestCase):
 
   def testEmpty(self):
     """Identifier should fail with empty input."""
-    self.assertIsNone(self.identifier.IdentifyFromLines([]))
+    self.assertIsNone(self.identifier.IdentifyFromLines([]).results)
 
   def testNoSyllables(self):
     """Identifier should return no result, for input containing no syllabes."""
     # self.assertIsNone(self.identifier.IdentifyFromLines(['t', 't', 't', 't']))
-    (full_match, results) = self.identifier.IdentifyFromLines(['t', 't', 't', 't'])
-    self.assertFalse(full_match)
-    self.assertFalse(results)
+    identification = self.identifier.IdentifyFromLines(['t', 't', 't', 't'])
+    self.assertFalse(identification.full_match)
+    self.assertFalse(identification.results)
 
 
 class KnownValues(unittest.TestCase):
@@ -34,10 +36,11 @@ class KnownValues(unittest.TestCase):
     self.identifier = identifier_pipeline.IdentifierPipeline()
 
   def AssertSingleMatchResultEquals(self, identification, metre_name):
+    results = None
     try:
-      (full_match, results) = identification
+      (full_match, results) = (identification.full_match, identification.results)
       assert full_match
-      assert isinstance(results, list)
+      assert isinstance(results, tuple)
       assert len(results) == 1
       result = results[0]
       assert result == metre_name
@@ -101,9 +104,131 @@ class KnownValues(unittest.TestCase):
     """Test a verse that has typos, and see if correct metre can be guessed."""
     verse = ['स्मराहुताशनमुर्मुरचूर्णतां दधुरिवाम्रवनस्य रजःकणाः ।',
              'निपातिताः परितः पथिकव्रजानुपरि ते परितेपुरतो भृशम् ॥']
-    (full_match, results) = self.identifier.IdentifyFromLines(verse)
-    self.assertFalse(full_match)
-    self.assertIsNotNone(results)
+    identification = self.identifier.IdentifyFromLines(verse)
+    self.assertFalse(identification.full_match)
+    self.assertIsNotNone(identification.results)
+
+
+class PriorityOrder(unittest.TestCase):
+
+  def __init__(self, *args, **kwargs):
+    super(PriorityOrder, self).__init__(*args, **kwargs)
+    self.identifier = identifier_pipeline.IdentifierPipeline().identifier
+
+  def testSameAsAllResults(self):
+    """The lazy matches should be the full results, in order of priority."""
+    for pattern_lines in [['GGLGGLLGLGG', 'GGLGGLLGLGG', 'GGLGGLLGLGG', 'GGLGGLLGLGG'],
+                          ['GGLGGLLGLGG', 'GGLGGLLGLGG', 'GGLGGLLGLGG', 'LLLLLLLLLLL'],
+                          ['LGLGLLLG']]:
+      results = self.identifier.IdentifyFromPatternLines(pattern_lines)
+      expected = [(match_type, metre_name)
+                  for match_type in ['exact', 'partial', 'accidental']
+                  for metre_name in results.get(match_type, [])]
+      self.assertEqual(list(self.identifier.MatchesInPriorityOrder(pattern_lines)), expected)
+
+  def testBytePatterns(self):
+    """Patterns given as str should be identified like unicode ones."""
+    pattern_lines = ['GGLGGLLGLGG', 'GGLGGLLGLGG', 'GGLGGLLGLGG', 'LLLLLLLLLLL']
+    self.assertEqual(
+        self.identifier.IdentifyFromPatternLines([line.encode('ascii') for line in pattern_lines]),
+        self.identifier.IdentifyFromPatternLines(pattern_lines))
+
+  def testEarlyExit(self):
+    """Stopping at an exact match should not try the halves and pādas."""
+    trace = Trace()
+    matches = self.identifier.MatchesInPriorityOrder(['GGLGGLLGLGG'] * 4, trace=trace)
+    self.assertEqual(next(matches), ('exact', 'indravajrā'))
+    self.assertFalse(any('half_1 pattern' in line for line in trace.Lines()))
+
+
+class Batch(unittest.TestCase):
+
+  def __init__(self, *args, **kwargs):
+    super(Batch, self).__init__(*args, **kwargs)
+    self.identifier = identifier_pipeline.IdentifierPipeline()
+
+  def testSameAsOneByOne(self):
+    """A batch should give the same results as identifying each verse, in order."""
+    verses = ['karmaṇyevādhikāraste\nmā phaleṣu kadācana |\nmā karmaphalahetur bhūr\nmā te saṅgo stvakarmaṇi ||47||',
+              't',
+              'nītijñā niyatijñāvādajñā api bhavanti vedajñāḥ\nbrahmajñā api labhyā\nsvājñāna-jñānino viralāḥ',
+              'karmaṇyevādhikāraste\nmā phaleṣu kadācana |\nmā karmaphalahetur bhūr\nmā te saṅgo stvakarmaṇi ||47||']
+    for debug in [True, False]:
+      cache = LruCache(1000)
+      batch = self.identifier.IdentifyBatch(verses, debug=debug, cache=cache)
+      self.assertEqual(batch, [self.identifier.IdentifyFromText(verse, debug=debug) for verse in verses])
+      self.assertTrue(cache.misses)
+
+  def testCacheIsBounded(self):
+    cache = LruCache(4)
+    for i in range(10):
+      cache.Put(i, i)
+    self.assertLessEqual(len(cache), 4)
+    self.assertEqual(cache.Get(9), 9)
+    self.assertIsNone(cache.Get(0))
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class Editing(unittest.TestCase):
+
+  def __init__(self, *args, **kwargs):
+    super(Editing, self).__init__(*args, **kwargs)
+    self.identifier = identifier_pipeline.IdentifierPipeline()
+
+  def testSameAsFromScratch(self):
+    """Each update should give the same result as identifying the text afresh."""
+    verse = 'yā kundendutuṣārahāradhavalā yā śubhravastrāvṛtā\nyā vīṇāvaradaṇḍamaṇḍitakarā yā śvetapadmāsanā'
+    texts = [verse[:n] for n in range(0, len(verse) + 1, 7)] + [
+        verse, verse, verse.replace('yā vīṇā', 'yā vīṇā '), verse.replace('\nyā', '\nhyā'),
+        verse + '\nyā', verse, 'yā', '']
+    session = identifier_pipeline.EditSession(self.identifier)
+    for text in texts:
+      self.assertEqual(session.Update(text), self.identifier.IdentifyFromText(text, debug=False))
+
+  def testChangedLines(self):
+    """A consonant added at the start of a line can change the previous line."""
+    session = identifier_pipeline.EditSession(self.identifier)
+    session.Update('rAma\nagacCat\nanam')
+    self.assertEqual(session.changed_lines, [0, 1, 2])
+    session.Update('rAma\nhy agacCat\nanam')
+    self.assertEqual(session.changed_lines, [0])
+    session.Update('rAma\nhy agacCat\nanam')
+    self.assertEqual(session.changed_lines, [])
+    session.Update('rAma\nhy agacCat')
+    self.assertEqual(session.changed_lines, [1])
+
+
+class Concurrency(unittest.TestCase):
+
+  def __init__(self, *args, **kwargs):
+    super(Concurrency, self).__init__(*args, **kwargs)
+    self.identifier = identifier_pipeline.IdentifierPipeline()
+
+  def testSharedPipeline(self):
+    """Calls from many threads on one pipeline should not affect each other."""
+    verses = [['karmaṇyevādhikāraste', 'mā phaleṣu kadācana |',
+               'mā karmaphalahetur bhūr', 'mā te saṅgo stvakarmaṇi ||47||'],
+              ['yā kundendutuṣārahāradhavalā yā śubhravastrāvṛtā',
+               'yā vīṇāvaradaṇḍamaṇḍitakarā yā śvetapadmāsanā',
+               'yā brahmācyutaśaṅkaraprabhṛtibhirdevaiḥ sadā vanditā',
+               'sā māṃ pātu sarasvatī bhagavatī niḥśeṣajāḍyāpahā']]
+    expected = [self.identifier.IdentifyFromLines(verse) for verse in verses]
+    got = [[] for _ in verses]
+
+    def Identify(i):
+      for _ in range(20):
+        got[i].append(self.identifier.IdentifyFromLines(verses[i]))
+
+    threads = [threading.Thread(target=Identify, args=(i,)) for i in range(len(verses))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    for i in range(len(verses)):
+      for identification in got[i]:
+        self.assertEqual(identification.results, expected[i].results)
+        self.assertEqual(identification.tables, expected[i].tables)
+        self.assertEqual(identification.debug_identify, expected[i].debug_identify)
 
 if __name__ == '__main__':
   unittest.main()
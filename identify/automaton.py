@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""A single automaton that matches a pattern against many metre regexes at once.
+
+The regexes in metrical_data are over the alphabet {'L', 'G'}, and use only
+'.', grouping, alternation and (rarely) the repetition operators '?', '*', '+'.
+Instead of trying each of them in turn with re.match, we compile all of them
+(for one part type) into a single NFA, and run it as a DFA that is built lazily:
+each DFA state is the set of NFA nodes we could be in, and a transition is
+computed the first time it is needed and cached after that. So a pattern is
+matched against every regex in a single left-to-right pass, and we find every
+regex that matches, not just the first.
+
+The DFA is a cache shared by all callers, so it is only extended while holding
+a lock. Reading an existing transition needs no lock: a new state is fully built
+before any transition points to it, and when the cache is thrown away, a call in
+progress keeps using the old one.
+
+Alternations whose branches are all plain patterns are compiled into a trie, so
+that they stay deterministic and small. Mātrā-vṛtta-s (see matra.py) are added
+as a sequence of gaṇa-s, and a gaṇa that only constrains the number of mātrā-s
+becomes a chain of nodes counting them.
+
+Most regexes can match patterns of only a few lengths (a sama-vṛtta only those
+of one length), so each regex is annotated with the least and greatest length
+it can match, and the DFA has a separate start state for each pattern length,
+made from only the regexes that can match that length. A pattern of a length
+that no regex can match is rejected without being read.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import re
+import threading
+
+# The same as the bits in packed_pattern.
+_SYMBOLS = {'L': 0, 'G': 1}
+_ANY = (0, 1)
+
+# DFA state 0 is the dead state (no NFA nodes).
+_DEAD = 0
+
+# Beyond this many DFA states, the cache is thrown away and rebuilt as needed.
+_MAX_DFA_STATES = 10000
+
+_PLAIN_RUN_RE = re.compile('[LG]+')
+
+
+def _Parse(regex):
+  """Parses regex into a tree of ('str', s), ('any',), ('cat', [...]), ('alt', [...]), etc."""
+  if regex.startswith('^'): regex = regex[1:]
+  if regex.endswith('$'): regex = regex[:-1]
+  position = [0]
+
+  def Peek():
+    return regex[position[0]] if position[0] < len(regex) else None
+
+  def ParseAlternation():
+    branches = [ParseConcatenation()]
+    while Peek() == '|':
+      position[0] += 1
+      branches.append(ParseConcatenation())
+    if len(branches) == 1:
+      return branches[0]
+    if all(branch[0] == 'str' for branch in branches):
+      return ('trie', [branch[1] for branch in branches])
+    return ('alt', branches)
+
+  def ParseConcatenation():
+    parts = []
+    while Peek() not in [None, '|', ')']:
+      run = _PLAIN_RUN_RE.match(regex, position[0])
+      if run and run.end() < len(regex) and regex[run.end()] in '?*+':
+        # The repetition applies only to the last symbol of the run.
+        run = _PLAIN_RUN_RE.match(regex, position[0], run.end() - 1)
+      if run:
+        part = ('str', run.group())
+        position[0] = run.end()
+      else:
+        part = ParseRepetition()
+      if part[0] == 'str' and parts and parts[-1][0] == 'str':
+        parts[-1] = ('str', parts[-1][1] + part[1])
+      else:
+        parts.append(part)
+    if not parts:
+      return ('str', '')
+    if len(parts) == 1:
+      return parts[0]
+    return ('cat', parts)
+
+  def ParseRepetition():
+    atom = ParseAtom()
+    while Peek() in ['?', '*', '+']:
+      atom = ({'?': 'opt', '*': 'star', '+': 'plus'}[Peek()], atom)
+      position[0] += 1
+    return atom
+
+  def ParseAtom():
+    c = Peek()
+    position[0] += 1
+    if c in _SYMBOLS:
+      return ('str', c)
+    if c == '.':
+      return ('any',)
+    assert c == '(', (regex, position[0] - 1, c)
+    inner = ParseAlternation()
+    assert Peek() == ')', (regex, position[0])
+    position[0] += 1
+    return inner
+
+  tree = ParseAlternation()
+  assert position[0] == len(regex), (regex, position[0])
+  return tree
+
+
+def _LengthRange(tree):
+  """(least, greatest) length of the patterns matched by tree; greatest is None if unbounded."""
+  kind = tree[0]
+  if kind == 'str':
+    return (len(tree[1]), len(tree[1]))
+  if kind == 'any':
+    return (1, 1)
+  if kind == 'trie':
+    return (min(len(s) for s in tree[1]), max(len(s) for s in tree[1]))
+  if kind == 'cat':
+    return _ConcatenatedLengthRange([_LengthRange(part) for part in tree[1]])
+  if kind == 'alt':
+    return _AlternativeLengthRange([_LengthRange(branch) for branch in tree[1]])
+  if kind == 'opt':
+    return (0, _LengthRange(tree[1])[1])
+  if kind == 'star':
+    return (0, None)
+  if kind == 'plus':
+    return (_LengthRange(tree[1])[0], None)
+  assert False, tree
+
+
+def _GanaLengthRange(gana):
+  if gana.IsConstrained():
+    lengths = [len(p) for p in gana.Patterns()]
+    return (min(lengths), max(lengths))
+  # From all guru-s (as far as possible) to all laghu-s.
+  least = (gana.matras + 1) // 2
+  if gana.loose_end:
+    # Guru-s and then a final laghu, with mātrā-s one fewer.
+    least = min(least, (gana.matras - 2 + 1) // 2 + 1)
+  return (least, gana.matras)
+
+
+def _ConcatenatedLengthRange(ranges):
+  least = sum(low for (low, _) in ranges)
+  if any(high is None for (_, high) in ranges):
+    return (least, None)
+  return (least, sum(high for (_, high) in ranges))
+
+
+def _AlternativeLengthRange(ranges):
+  least = min(low for (low, _) in ranges)
+  if any(high is None for (_, high) in ranges):
+    return (least, None)
+  return (least, max(high for (_, high) in ranges))
+
+
+class CombinedMatcher(object):
+  """Matches a pattern against a list of regexes, each with an associated value.
+
+  The values are dicts like those in the known_*_patterns dicts: metre_name ->
+  True (for full matches) or metre_name -> set of pādas/halves.
+  """
+
+  def __init__(self):
+    # The NFA. For each node: the symbols it accepts (None for an epsilon node),
+    # and the nodes that follow it.
+    self._symbols = []
+    self._next = []
+    self._accepting = {}  # node -> index into self._values
+    self._starts = []
+    self._values = []
+    # For each regex, the (least, greatest) length of patterns it can match.
+    self._length_ranges = []
+    self._lock = threading.Lock()
+    self._ResetDfa()
+
+  def __len__(self):
+    return len(self._values)
+
+  def Add(self, regex, value):
+    """Adds a regex (over {L, G}) to the automaton."""
+    accept = self._NewNode(None, [])
+    self._accepting[accept] = len(self._values)
+    self._values.append(value)
+    tree = _Parse(regex)
+    self._starts.append(self._Build(tree, accept))
+    self._length_ranges.append(_LengthRange(tree))
+    self._ResetDfa()
+
+  def AddJati(self, pada_ganas, value):
+    """Adds a mātrā-vṛtta, given as a list of gaṇa-s for each pāda."""
+    accept = self._NewNode(None, [])
+    self._accepting[accept] = len(self._values)
+    self._values.append(value)
+    follow = accept
+    for ganas in reversed(pada_ganas):
+      for gana in reversed(ganas):
+        follow = self._BuildGana(gana, follow)
+    self._starts.append(follow)
+    self._length_ranges.append(_ConcatenatedLengthRange(
+        [_GanaLengthRange(gana) for ganas in pada_ganas for gana in ganas]))
+    self._ResetDfa()
+
+  def Values(self):
+    """The values of the regexes, in the order they were added."""
+    return list(self._values)
+
+  def ToData(self):
+    """The NFA as plain lists and dicts, e.g. for marshal."""
+    return (self._symbols, self._next, self._accepting, self._starts, self._values,
+            self._length_ranges)
+
+  def FromData(self, nfa_data):
+    """Replaces the NFA with one returned by ToData."""
+    (self._symbols, self._next, self._accepting, self._starts, self._values,
+     self._length_ranges) = nfa_data
+    self._ResetDfa()
+
+  def Matches(self, packed):
+    """The merged values of all regexes that match the given PackedPattern."""
+    dfa = self._dfa
+    if len(dfa.states) > _MAX_DFA_STATES:
+      with self._lock:
+        if dfa is self._dfa:
+          self._ResetDfa()
+      dfa = self._dfa
+    transitions = dfa.transitions
+    (length, bits) = packed
+    state = dfa.starts.get(length)
+    if state is None:
+      state = self._StartFor(dfa, length)
+    if state == _DEAD:
+      return {}
+    for i in xrange(length - 1, -1, -1):
+      symbol = (bits >> i) & 1
+      next_state = transitions[state][symbol]
+      if next_state is None:
+        next_state = self._Step(dfa, state, symbol)
+      if next_state == _DEAD:
+        return {}
+      state = next_state
+    matches = dfa.matches[state]
+    if matches is None:
+      matches = self._MergedValues(dfa.states[state])
+      dfa.matches[state] = matches
+    return matches
+
+  def _NewNode(self, symbols, next_nodes):
+    self._symbols.append(symbols)
+    self._next.append(next_nodes)
+    return len(self._symbols) - 1
+
+  def _Build(self, tree, follow):
+    """Adds NFA nodes for the tree, leading to follow. Returns the start node."""
+    kind = tree[0]
+    if kind == 'str':
+      for c in reversed(tree[1]):
+        follow = self._NewNode((_SYMBOLS[c],), [follow])
+      return follow
+    if kind == 'any':
+      return self._NewNode(_ANY, [follow])
+    if kind == 'cat':
+      for part in reversed(tree[1]):
+        follow = self._Build(part, follow)
+      return follow
+    if kind == 'alt':
+      return self._NewNode(None, [self._Build(branch, follow) for branch in tree[1]])
+    if kind == 'trie':
+      return self._BuildTrie(tree[1], follow)
+    if kind == 'opt':
+      return self._NewNode(None, [self._Build(tree[1], follow), follow])
+    if kind in ['star', 'plus']:
+      loop = self._NewNode(None, [])
+      start = self._Build(tree[1], loop)
+      self._next[loop] = [start, follow]
+      return loop if kind == 'star' else start
+    assert False, tree
+
+  def _BuildTrie(self, strings, follow):
+    """Adds NFA nodes for the alternation of (plain) strings, sharing prefixes."""
+    branches = []
+    if '' in strings:
+      branches.append(follow)
+    for c in 'LG':
+      rest = [s[1:] for s in strings if s.startswith(c)]
+      if rest:
+        branches.append(self._NewNode((_SYMBOLS[c],), [self._BuildTrie(rest, follow)]))
+    if len(branches) == 1:
+      return branches[0]
+    return self._NewNode(None, branches)
+
+  def _BuildGana(self, gana, follow):
+    """Adds NFA nodes for a gaṇa, leading to follow. Returns the start node."""
+    if gana.IsConstrained():
+      return self._BuildTrie(gana.Patterns(), follow)
+    # counting[k] is the node after k mātrā-s of the gaṇa have been seen.
+    counting = [None] * gana.matras + [follow]
+    for k in reversed(range(gana.matras)):
+      after_laghu = counting[k + 1]
+      if gana.loose_end and k + 1 == gana.matras - 1:
+        after_laghu = self._NewNode(None, [after_laghu, follow])
+      branches = [self._NewNode((_SYMBOLS['L'],), [after_laghu])]
+      if k + 2 <= gana.matras:
+        branches.append(self._NewNode((_SYMBOLS['G'],), [counting[k + 2]]))
+      counting[k] = self._NewNode(None, branches)
+    return counting[0]
+
+  def _ResetDfa(self):
+    self._closures = {}
+    self._dfa = _Dfa()
+
+  def _Closure(self, nodes):
+    """The non-epsilon nodes (and accepting nodes) reachable from nodes."""
+    closure = set()
+    for node in nodes:
+      if node not in self._closures:
+        self._closures[node] = self._ComputeClosure(node)
+      closure.update(self._closures[node])
+    return frozenset(closure)
+
+  def _ComputeClosure(self, node):
+    seen = set()
+    closure = set()
+    stack = [node]
+    while stack:
+      node = stack.pop()
+      if node in seen:
+        continue
+      seen.add(node)
+      if self._symbols[node] is not None or node in self._accepting:
+        closure.add(node)
+      else:
+        stack.extend(self._next[node])
+    return frozenset(closure)
+
+  def _DfaState(self, dfa, nodes):
+    state = dfa.state_ids.get(nodes)
+    if state is None:
+      state = len(dfa.states)
+      dfa.states.append(nodes)
+      dfa.transitions.append([None, None])
+      dfa.matches.append(None)
+      dfa.state_ids[nodes] = state
+    return state
+
+  def _StartFor(self, dfa, length):
+    """The start state for patterns of this length: only regexes that can match it."""
+    with self._lock:
+      if length not in dfa.starts:
+        starts = [start for (start, (least, greatest)) in zip(self._starts, self._length_ranges)
+                  if least <= length and (greatest is None or length <= greatest)]
+        dfa.starts[length] = self._DfaState(dfa, self._Closure(starts))
+      return dfa.starts[length]
+
+  def _Step(self, dfa, state, symbol):
+    with self._lock:
+      next_state = dfa.transitions[state][symbol]
+      if next_state is not None:
+        # Another thread got here first.
+        return next_state
+      successors = []
+      for node in dfa.states[state]:
+        symbols = self._symbols[node]
+        if symbols is not None and symbol in symbols:
+          successors.extend(self._next[node])
+      next_state = self._DfaState(dfa, self._Closure(successors))
+      dfa.transitions[state][symbol] = next_state
+      return next_state
+
+  def _MergedValues(self, nodes):
+    """Values of all regexes accepting in this DFA state, in the order they were added."""
+    merged = collections.OrderedDict()
+    indices = sorted(self._accepting[node] for node in nodes
+                     if node in self._accepting)
+    for index in indices:
+      for (metre_name, value) in self._values[index].items():
+        if value is True:
+          merged[metre_name] = True
+        else:
+          merged.setdefault(metre_name, set()).update(value)
+    return merged
+
+
+class _Dfa(object):
+  """The lazily built DFA: each state is a frozenset of NFA nodes."""
+
+  def __init__(self):
+    # State 0 is the dead state.
+    self.states = [frozenset()]
+    self.state_ids = {frozenset(): _DEAD}
+    self.transitions = [[_DEAD, _DEAD]]
+    self.matches = [{}]
+    # Pattern length -> start state.
+    self.starts = {}
@@ -3,13 +3,16 @@
 
 The input is a list of "pattern" lines, where a "pattern" is a sequence over the
 alphabet {'L', 'G'}. The output is a list of metre names (strings).
+
+Internally, patterns are PackedPattern-s (see packed_pattern.py).
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import collections
 import logging
-import re
+
+from identify import packed_pattern
 
 class OrderedSet(collections.OrderedDict):
   def add(self, x):
@@ -17,73 +20,131 @@ class OrderedSet(collections.OrderedDict):
 
 
 class Identifier(object):
-  """An object used to make a single metre-identification call."""
+  """Identifies metres using the given metrical data.
+
+  An Identifier keeps no state between calls, so one Identifier can be shared
+  by many threads.
+  """
 
   def __init__(self, metrical_data):
-    self._Reset()
     self.metrical_data = metrical_data
     logging.debug('Identifier is initialized. It knows %d full regexes, %d full patterns, %d half regexes, %d half patterns, %d pada regexes, %d pada patterns',
-                  len(self.metrical_data.known_full_regexes), len(self.metrical_data.known_full_patterns),
-                  len(self.metrical_data.known_half_regexes), len(self.metrical_data.known_half_patterns),
-                  len(self.metrical_data.known_pada_regexes), len(self.metrical_data.known_pada_patterns))
+                  len(self.metrical_data.known_full_automaton), len(self.metrical_data.known_full_patterns),
+                  len(self.metrical_data.known_half_automaton), len(self.metrical_data.known_half_patterns),
+                  len(self.metrical_data.known_pada_automaton), len(self.metrical_data.known_pada_patterns))
+
+  def IdentifyFromPatternLines(self, pattern_lines, input_type='full', trace=None, cache=None):
+    """Pattern lines can be strings over {'L', 'G'} or PackedPattern-s.
+
+    Returns { 'exact': {..}, 'partial': {...}, 'accidental': {..} }. If a
+    utils.Trace is given, debug output about each part tried is added to it. If
+    a utils.LruCache is given, lookups of parts are answered from it when
+    possible (useful when identifying many verses).
+    """
+    ret = {}  # { 'exact': {..}, 'partial': {...}, 'accidental': {..} }
+    for (match_type, metre_name) in self.MatchesInPriorityOrder(pattern_lines, input_type, trace, cache):
+      if match_type not in ret:
+        ret[match_type] = OrderedSet()
+      ret[match_type].add(metre_name)
+    return ret
 
-  def _Reset(self):
-    """Clear all parameters, for use again."""
-    self.global_debug = []
-    self.parts_debug = []
+  def MatchesInPriorityOrder(self, pattern_lines, input_type='full', trace=None, cache=None):
+    """Yields (match_type, metre_name): all exact, then partial, then accidental matches.
 
-  def IdentifyFromPatternLines(self, pattern_lines, input_type='full'):
-    self._Reset()
+    Within each match type, the metres are in the order they are found (the same
+    as in IdentifyFromPatternLines), each once. The work is done only as the
+    caller asks for more: exact matches can only come from the full pattern, so
+    a caller that stops at an exact match causes no half, pāda or line to be
+    tried. (With a trace, the debug output covers only the parts tried.)
+    """
+    if trace is not None:
+      trace.Add('Global:')
     # Too many lines => probably multiple verses.
     if len(pattern_lines) > 12:
-      self.global_debug.append('Error: too many lines in verse. Perhaps these are multiple verses?')
-      return {}
+      if trace is not None:
+        trace.Add('Error: too many lines in verse. Perhaps these are multiple verses?')
+        trace.Add('Parts:')
+      return
+    if trace is not None:
+      trace.Add('Parts:')
 
-    ret = {}  # { 'exact': {..}, 'partial': {...}, 'accidental': {..} }
+    pattern_lines = [packed_pattern.Pack(line) if isinstance(line, basestring) else line
+                     for line in pattern_lines]
+    seen = set()
+    accidental = []
+    for (match_type, metre_name) in self._AllMatches(pattern_lines, input_type, trace, cache):
+      if (match_type, metre_name) in seen:
+        continue
+      seen.add((match_type, metre_name))
+      if match_type == 'accidental':
+        # Only after we know there are no more exact or partial matches.
+        accidental.append(metre_name)
+      else:
+        assert match_type == 'partial' or not accidental, 'Exact match found late'
+        yield (match_type, metre_name)
+    for metre_name in accidental:
+      yield ('accidental', metre_name)
 
+  def _AllMatches(self, pattern_lines, input_type, trace, cache):
+    """Yields (match_type, metre_name) for each part and table, in the order tried."""
     for (part_type, part_patterns) in _Parts(pattern_lines):
       for pattern in part_patterns:
-        self.parts_debug.append('  %s pattern %s (%d syllables, %d mātras)' % (part_type, pattern, len(pattern), _MatraCount(pattern)))
-        last_debug_line_length = len(self.parts_debug[-1])
-        matches_for_part = self._MatchesFor(pattern, input_type, part_type, last_debug_line_length)
+        indentation = None
+        if trace is not None:
+          pattern_debug = '  %s pattern %s (%d syllables, %d mātras)' % (
+              part_type, packed_pattern.Unpack(pattern), pattern.length,
+              packed_pattern.MatraCount(pattern))
+          trace.Add(pattern_debug)
+          indentation = ' ' * len(pattern_debug)
         # Loop over full, half, pada
-        for (metre_name, value) in matches_for_part.get('full', {}).items():
+        for (metre_name, value) in self._MatchesFor(pattern, 'full', cache).items():
           assert value == True
           match_type = _MatchTypeFull(input_type, part_type)
-          self.parts_debug.append(' %s %s match for: %s %s' % (' ' * last_debug_line_length, match_type, metre_name, value))
-          ret.setdefault(match_type, OrderedSet()).add(metre_name)
-        for (metre_name, value) in matches_for_part.get('half', {}).items():
+          _TraceMatch(trace, indentation, match_type, metre_name, value)
+          yield (match_type, metre_name)
+        for (metre_name, value) in self._MatchesFor(pattern, 'half', cache).items():
           match_type = _MatchTypeHalf(input_type, part_type, value)
-          self.parts_debug.append(' %s %s match for: %s %s' % (' ' * last_debug_line_length, match_type, metre_name, value))
-          ret.setdefault(match_type, OrderedSet()).add(metre_name)
-        for (metre_name, value) in matches_for_part.get('pada', {}).items():
+          _TraceMatch(trace, indentation, match_type, metre_name, value)
+          yield (match_type, metre_name)
+        for (metre_name, value) in self._MatchesFor(pattern, 'pada', cache).items():
           match_type = _MatchTypePada(input_type, part_type, value)
-          self.parts_debug.append(' %s %s match for: %s %s' % (' ' * last_debug_line_length, match_type, metre_name, value))
-          ret.setdefault(match_type, OrderedSet()).add(metre_name)
-    # Done looping over all part types.
-    return ret
+          _TraceMatch(trace, indentation, match_type, metre_name, value)
+          yield (match_type, metre_name)
 
-  def _MatchesFor(self, pattern, input_type, part_type, debug_indentation_depth):
-    ret = {
-      'full': _MatchesIn(pattern, self.metrical_data.known_full_patterns, self.metrical_data.known_full_regexes),
-      'half': _MatchesIn(pattern, self.metrical_data.known_half_patterns, self.metrical_data.known_half_regexes),
-      'pada': _MatchesIn(pattern, self.metrical_data.known_pada_patterns, self.metrical_data.known_pada_regexes)
-    }
-    assert type(ret.get('full', {})) == dict
-    assert type(ret.get('half', {})) == dict
-    assert type(ret.get('pada', {})) == dict
+  def _MatchesFor(self, pattern, table_type, cache=None):
+    """Matches for the pattern in the 'full', 'half' or 'pada' table."""
+    if cache is not None:
+      key = (table_type, pattern)
+      ret = cache.Get(key)
+      if ret is None:
+        ret = self._MatchesFor(pattern, table_type)
+        cache.Put(key, ret)
+      return ret
+    if table_type == 'full':
+      ret = _MatchesIn(pattern, self.metrical_data.known_full_patterns, self.metrical_data.known_full_automaton)
+    elif table_type == 'half':
+      ret = _MatchesIn(pattern, self.metrical_data.known_half_patterns, self.metrical_data.known_half_automaton)
+    else:
+      assert table_type == 'pada', table_type
+      ret = _MatchesIn(pattern, self.metrical_data.known_pada_patterns, self.metrical_data.known_pada_automaton)
+    assert isinstance(ret, dict)
     return ret
 
 
-def _MatchesIn(pattern, known_patterns, known_regexes):
-  if pattern in known_patterns:
-    assert type(known_patterns[pattern]) == dict
-    return known_patterns[pattern]
-  for (regex, matches) in known_regexes:
-    if regex.match(pattern):
-      assert type(matches) == dict
-      return matches
-  return {}
+def _TraceMatch(trace, indentation, match_type, metre_name, value):
+  if trace is not None:
+    trace.Add(' %s %s match for: %s %s', indentation, match_type, metre_name, value)
+
+
+def _MatchesIn(pattern, known_patterns, known_automaton):
+  """Matches for the pattern if known, else for all regexes matching it."""
+  matches = known_patterns.Matches(pattern)
+  if matches:
+    assert isinstance(matches, dict)
+    return matches
+  matches = known_automaton.Matches(pattern)
+  assert isinstance(matches, dict)
+  return matches
 
 
 def _MatchTypeFull(input_type, part_type):
@@ -118,13 +179,15 @@ def _MatchTypePada(input_type, part_type, value):
 def _SplitHalves(full_pattern):
   """Attempt splits at halves."""
   splits = []
-  n = len(full_pattern)
+  n = full_pattern.length
   if n % 2 == 0:
     m = n // 2
-    splits.append([full_pattern[:m], full_pattern[m:]])
+    splits.append([packed_pattern.Slice(full_pattern, 0, m),
+                   packed_pattern.Slice(full_pattern, m, n)])
   else:
     for m in [(n-1)//2, (n+1)//2]:
-      splits.append([full_pattern[:m], full_pattern[m:]])
+      splits.append([packed_pattern.Slice(full_pattern, 0, m),
+                     packed_pattern.Slice(full_pattern, m, n)])
   return splits
 
 
@@ -142,7 +205,7 @@ def _SplitQuarters(full_pattern):
 
   splits = []
   mss = []
-  n = len(full_pattern)
+  n = full_pattern.length
   if n % 4 == 0:
     m = n // 4
     mss.append(Cumulative([m, m, m]))
@@ -179,17 +242,13 @@ def _SplitQuarters(full_pattern):
     mss.append(Cumulative([m, m, m - 1]))
     mss.append(Cumulative([m, m, m]))
   for ms in mss:
-    splits.append([full_pattern[:ms[0]],
-                   full_pattern[ms[0]:ms[1]],
-                   full_pattern[ms[1]:ms[2]],
-                   full_pattern[ms[2]:]])
+    splits.append([packed_pattern.Slice(full_pattern, 0, ms[0]),
+                   packed_pattern.Slice(full_pattern, ms[0], ms[1]),
+                   packed_pattern.Slice(full_pattern, ms[1], ms[2]),
+                   packed_pattern.Slice(full_pattern, ms[2], n)])
   return splits
 
 
-def _IsPattern(pattern):
-  return re.match('^[LG]+$', pattern)
-
-
 # TODO(shreevatsa): Distinguish between exact (unique) and approximate halves/padas.
 def _Parts(pattern_lines):
   """ {
@@ -201,13 +260,18 @@ def _Parts(pattern_lines):
     'pada_3': [...],
     'pada_4': [...],
     'lines': [...] (can overlap with pada_n / half_n)
-  }.items() (ordered)
+  }.items() (ordered), generated lazily.
   """
-  pattern_lines = [line for line in pattern_lines if _IsPattern(line)]
-  full_pattern = ''.join(pattern_lines)
+  pattern_lines = [line for line in pattern_lines if line.length]
+  full_pattern = packed_pattern.Concatenate(pattern_lines)
+  # The rest need not be computed if the caller stops after the full pattern.
+  yield ('full', [full_pattern])
   ret = {}
-  def add(x, e): ret.setdefault(x, set()).add(e)
-  ret['full'] = [full_pattern]
+  seen = set()
+  def add(x, e):
+    if (x, e) not in seen:
+      seen.add((x, e))
+      ret.setdefault(x, []).append(e)
   for (ab, cd) in _SplitHalves(full_pattern):
     add('half_1', ab)
     add('half_2', cd)
@@ -219,34 +283,31 @@ def _Parts(pattern_lines):
   # Add groups of lines to 'half_*' and 'pada_*'
   n = len(pattern_lines)
   if n % 2 == 0:
-    half_1 = ''.join(pattern_lines[ : n//2])
+    half_1 = packed_pattern.Concatenate(pattern_lines[ : n//2])
     add('half_1', half_1)
     for (a, b) in _SplitHalves(half_1):
       add('pada_1', a)
       add('pada_2', b)
-    half_2 = ''.join(pattern_lines[n//2 : ])
+    half_2 = packed_pattern.Concatenate(pattern_lines[n//2 : ])
     add('half_2', half_2)
     for (c, d) in _SplitHalves(half_2):
       add('pada_3', c)
       add('pada_4', d)
   if n % 4 == 0:
-    add('pada_1', ''.join(pattern_lines[: n//4]))
-    add('pada_2', ''.join(pattern_lines[n//4 : n//2]))
-    add('pada_3', ''.join(pattern_lines[n//2 : 3*n//4]))
-    add('pada_4', ''.join(pattern_lines[3*n//4 : ]))
+    add('pada_1', packed_pattern.Concatenate(pattern_lines[: n//4]))
+    add('pada_2', packed_pattern.Concatenate(pattern_lines[n//4 : n//2]))
+    add('pada_3', packed_pattern.Concatenate(pattern_lines[n//2 : 3*n//4]))
+    add('pada_4', packed_pattern.Concatenate(pattern_lines[3*n//4 : ]))
   if n not in [1, 2, 4]:
     # When n is 1, 2, or 4, each line already accounted for as full/half/pada.
     ret['lines'] = pattern_lines
-  return [
-           ('full', ret.get('full', set())),
-           ('half_1', ret.get('half_1', set())),
-           ('half_2', ret.get('half_2', set())),
-           ('pada_1', ret.get('pada_1', set())),
-           ('pada_2', ret.get('pada_2', set())),
-           ('pada_3', ret.get('pada_3', set())),
-           ('pada_3', ret.get('pada_4', set())),
-           ('lines', ret.get('lines', set()))
-         ]
-
-def _MatraCount(pattern):
-  return sum(2 if c == 'G' else 1 for c in pattern)
+  for part in [
+           ('half_1', ret.get('half_1', [])),
+           ('half_2', ret.get('half_2', [])),
+           ('pada_1', ret.get('pada_1', [])),
+           ('pada_2', ret.get('pada_2', [])),
+           ('pada_3', ret.get('pada_3', [])),
+           ('pada_3', ret.get('pada_4', [])),
+           ('lines', ret.get('lines', []))
+         ]:
+    yield part
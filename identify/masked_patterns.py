@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""A table of known patterns, in which some positions can be "don't care".
+
+The last syllable of a pāda may be either laghu or guru (pādānta-laghu), so a
+sama-vṛtta has 2**4 = 16 full patterns, 4 half patterns and 2 pāda patterns.
+Instead of storing each of these variants, we store one canonical pattern (with
+a guru in each free position) along with the set of free positions. With packed
+patterns (see packed_pattern.py), the free positions are a bit mask, and making
+a pattern canonical is a bitwise or. To look up a pattern, we make it canonical
+in this way for each mask known for patterns of that length, and look that up.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+from identify import packed_pattern
+
+
+def _MergeInto(merged, matches):
+  for (metre_name, value) in matches.items():
+    if value is True:
+      merged[metre_name] = True
+    else:
+      merged.setdefault(metre_name, set()).update(value)
+
+
+class MaskedPatterns(object):
+  """Maps patterns (with some free positions) to dicts of matches.
+
+  The dicts of matches are like metre_name -> True (for full matches) or
+  metre_name -> set of pādas/halves; those for the same pattern are merged.
+  """
+
+  def __init__(self):
+    # (length, mask of free positions) -> {bits of canonical pattern -> matches}
+    self._groups = {}
+    # length -> list of masks for patterns of that length
+    self._masks_by_length = {}
+    self._num_patterns = 0
+
+  def __len__(self):
+    return self._num_patterns
+
+  def Add(self, pattern, matches, free_positions=()):
+    """Adds the pattern (a string), in which each of free_positions can be L or G."""
+    packed = packed_pattern.Pack(pattern)
+    mask = packed_pattern.PositionsMask(packed.length, free_positions)
+    key = (packed.length, mask)
+    if key not in self._groups:
+      self._groups[key] = {}
+      self._masks_by_length.setdefault(packed.length, []).append(mask)
+    group = self._groups[key]
+    canonical = packed.bits | mask
+    if canonical not in group:
+      group[canonical] = {}
+      self._num_patterns += 1
+    _MergeInto(group[canonical], matches)
+
+  def Matches(self, packed):
+    """The matches for all known patterns that the PackedPattern is a variant of."""
+    found = []
+    (length, bits) = packed
+    for mask in self._masks_by_length.get(length, []):
+      matches = self._groups[(length, mask)].get(bits | mask)
+      if matches:
+        found.append(matches)
+    if len(found) == 1:
+      return found[0]
+    merged = collections.OrderedDict()
+    for matches in found:
+      _MergeInto(merged, matches)
+    return merged
+
+  def ToData(self):
+    """The table as plain lists and dicts, e.g. for marshal."""
+    return self._groups
+
+  def FromData(self, groups):
+    """Replaces the table with one returned by ToData."""
+    self._groups = groups
+    self._masks_by_length = {}
+    for (length, mask) in sorted(groups):
+      self._masks_by_length.setdefault(length, []).append(mask)
+    self._num_patterns = sum(len(group) for group in groups.values())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Mātrā-vṛtta-s (jāti-s): metres defined by counting mātrā-s, not syllables.
+
+A laghu syllable has one mātrā and a guru has two. A jāti like Āryā is described
+as a sequence of gaṇa-s per pāda, where each gaṇa has a fixed number of mātrā-s
+and possibly some rule about which arrangements of laghu/guru it may (or may
+not) have. For example, the odd gaṇa-s of Āryā have 4 mātrā-s but may not be
+LGL (ja-gaṇa).
+
+Such a description is compiled (by automaton.CombinedMatcher.AddJati) into a
+small automaton that just counts mātrā-s, instead of into an alternation listing
+every pattern with the right number of mātrā-s.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+def MatraCount(pattern):
+  return sum(2 if c == 'G' else 1 for c in pattern)
+
+
+def PatternsWithMatras(n):
+  """All patterns having exactly n mātrā-s."""
+  if n < 0:
+    return []
+  if n not in _patterns_memo:
+    _patterns_memo[n] = ([p + 'L' for p in PatternsWithMatras(n - 1)] +
+                         [p + 'G' for p in PatternsWithMatras(n - 2)])
+  return _patterns_memo[n]
+_patterns_memo = {0: [''], 1: ['L']}
+
+
+class Gana(object):
+  """A group of syllables with a fixed number of mātrā-s.
+
+  allowed: if given, the only patterns this gaṇa may have.
+  forbidden: patterns this gaṇa may not have.
+  loose_end: whether the last syllable may be a laghu counted as guru (at the
+             end of a pāda), e.g. with 4 mātrā-s, 'GL' is allowed as if 'GG'.
+  """
+
+  def __init__(self, matras, allowed=None, forbidden=None, loose_end=False):
+    self.matras = matras
+    self.allowed = allowed
+    self.forbidden = forbidden or []
+    self.loose_end = loose_end
+
+  def IsConstrained(self):
+    """Whether this gaṇa does anything more than count mātrā-s."""
+    return self.allowed is not None or bool(self.forbidden)
+
+  def Fits(self, pattern):
+    """Whether the pattern can be this gaṇa."""
+    if self._FitsExactly(pattern):
+      return True
+    return (self.loose_end and pattern.endswith('L') and
+            self._FitsExactly(pattern[:-1] + 'G'))
+
+  def Patterns(self):
+    """All patterns that can be this gaṇa (only sensible when few)."""
+    candidates = PatternsWithMatras(self.matras)
+    if self.loose_end:
+      candidates = candidates + [p for p in PatternsWithMatras(self.matras - 1)
+                                 if p.endswith('L')]
+    return [p for p in candidates if self.Fits(p)]
+
+  def _FitsExactly(self, pattern):
+    return (MatraCount(pattern) == self.matras and
+            (self.allowed is None or pattern in self.allowed) and
+            pattern not in self.forbidden)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Patterns packed into integers.
+
+A pattern like 'LGGL' is stored as PackedPattern(length=4, bits=0b0110): each
+syllable is one bit, G = 1 and L = 0, with the first syllable as the most
+significant bit. Splitting a pattern into halves or pāda-s is then done with
+shifts and masks, without building new strings, and the packed patterns can be
+used directly as dict keys.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+PackedPattern = collections.namedtuple('PackedPattern', ['length', 'bits'])
+
+EMPTY = PackedPattern(0, 0)
+
+
+def Pack(pattern):
+  """PackedPattern from a string (str or unicode) over {'L', 'G'}."""
+  if not pattern:
+    return EMPTY
+  return PackedPattern(len(pattern), int(pattern.replace('L', '0').replace('G', '1'), 2))
+
+
+def Unpack(packed):
+  """The string over {'L', 'G'} for a PackedPattern."""
+  if not packed.length:
+    return ''
+  binary = bin(packed.bits)[2:].zfill(packed.length)
+  return binary.replace('0', 'L').replace('1', 'G')
+
+
+def Slice(packed, start, end):
+  """Same as Pack(Unpack(packed)[start:end]), for 0 <= start <= end <= length."""
+  length = end - start
+  return PackedPattern(length, (packed.bits >> (packed.length - end)) & ((1 << length) - 1))
+
+
+def Concatenate(packed_patterns):
+  length = 0
+  bits = 0
+  for packed in packed_patterns:
+    length += packed.length
+    bits = (bits << packed.length) | packed.bits
+  return PackedPattern(length, bits)
+
+
+def Symbols(packed):
+  """The syllables from first to last, as 0 (laghu) or 1 (guru)."""
+  bits = packed.bits
+  return [(bits >> i) & 1 for i in range(packed.length - 1, -1, -1)]
+
+
+def PositionsMask(length, positions):
+  """The bits (of a pattern of this length) at the given positions."""
+  mask = 0
+  for i in positions:
+    mask |= 1 << (length - 1 - i)
+  return mask
+
+
+def MatraCount(packed):
+  # A laghu has one mātrā, a guru has two.
+  return packed.length + bin(packed.bits).count('1')
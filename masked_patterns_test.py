@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the table of known patterns with free positions."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from data import metrical_data
+from identify.masked_patterns import MaskedPatterns
+from identify.packed_pattern import Pack
+
+
+class Masked(unittest.TestCase):
+
+  def testPadaFinalVariants(self):
+    """A pāda-final syllable, free in the mask, can be either laghu or guru."""
+    table = MaskedPatterns()
+    table.Add('GGLGG', {'A': {1, 3}}, [4])
+    table.Add('LLLGG', {'B': {2}})
+    self.assertEqual(len(table), 2)
+    self.assertEqual(table.Matches(Pack('GGLGG')), {'A': {1, 3}})
+    self.assertEqual(table.Matches(Pack('GGLGL')), {'A': {1, 3}})
+    self.assertEqual(table.Matches(Pack('LLLGG')), {'B': {2}})
+    self.assertEqual(table.Matches(Pack('LLLGL')), {})
+    self.assertEqual(table.Matches(Pack('GGLLG')), {})
+    self.assertEqual(table.Matches(Pack('GGLG')), {})
+
+  def testMergedAcrossMasks(self):
+    """Matches for a pattern under different masks are merged, in the order added."""
+    table = MaskedPatterns()
+    table.Add('GGLGG', {'A': {1}}, [4])
+    table.Add('GGLGL', {'B': True, 'A': {2}})
+    table.Add('GGLGG', {'A': {3}}, [4])
+    self.assertEqual(len(table), 2)
+    self.assertEqual(table.Matches(Pack('GGLGG')), {'A': {1, 3}})
+    matches = table.Matches(Pack('GGLGL'))
+    self.assertEqual(matches, {'A': {1, 2, 3}, 'B': True})
+    self.assertEqual(list(matches), ['A', 'B'])
+
+  def testFromData(self):
+    """A table rebuilt from ToData should have the same matches."""
+    table = MaskedPatterns()
+    table.Add('GGLGG', {'A': {1}}, [2, 4])
+    table.Add('LG', {'B': True})
+    rebuilt = MaskedPatterns()
+    rebuilt.FromData(table.ToData())
+    self.assertEqual(len(rebuilt), 2)
+    for pattern in ['GGGGG', 'GGLGL', 'GGGGL', 'LG', 'GG']:
+      self.assertEqual(rebuilt.Matches(Pack(pattern)), table.Matches(Pack(pattern)))
+
+
+class MetricalData(unittest.TestCase):
+
+  def setUp(self):
+    if not metrical_data.all_data:
+      metrical_data.LoadData()
+
+  def testSamavrttaVariants(self):
+    """Each pāda of a sama-vṛtta may end in laghu, and is found through the mask."""
+    pada = 'GGLGLLLGLLGLGG'
+    for last in 'LG':
+      self.assertIn('Vasantatilakā',
+                    metrical_data.known_pada_patterns.Matches(Pack(pada[:-1] + last)))
+      self.assertIn('Vasantatilakā',
+                    metrical_data.known_full_patterns.Matches(Pack(
+                        pada + pada[:-1] + last + pada + pada[:-1] + last)))
+    self.assertNotIn('Vasantatilakā',
+                     metrical_data.known_pada_patterns.Matches(Pack('GGLGLLLGLLGLLG')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for mātrā-vṛtta-s (jāti-s)."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from data import metrical_data
+from identify import packed_pattern
+from identify.matra import Gana
+from identify import matra
+
+# Pādas of the Āryā family, gaṇa by gaṇa.
+_PADA_12 = 'GG' + 'LLG' + 'GG'
+_PADA_15 = 'GG' + 'GG' + 'L' + 'GG' + 'G'
+_PADA_18 = 'GG' + 'GG' + 'LGL' + 'GG' + 'G'
+
+
+class Ganas(unittest.TestCase):
+
+  def testPatternsWithMatras(self):
+    self.assertEqual(sorted(matra.PatternsWithMatras(4)), ['GG', 'GLL', 'LGL', 'LLG', 'LLLL'])
+    self.assertEqual([len(matra.PatternsWithMatras(n)) for n in range(8)], [1, 1, 2, 3, 5, 8, 13, 21])
+
+  def testFits(self):
+    odd_gana = Gana(4, forbidden=['LGL'])
+    self.assertTrue(odd_gana.Fits('LLG'))
+    self.assertFalse(odd_gana.Fits('LGL'))
+    self.assertFalse(odd_gana.Fits('GGL'))
+    final_syllable = Gana(2, allowed=['G'], loose_end=True)
+    self.assertEqual(final_syllable.Patterns(), ['G', 'L'])
+    self.assertFalse(Gana(4).IsConstrained())
+
+
+class AryaFamily(unittest.TestCase):
+
+  def setUp(self):
+    if not metrical_data.known_full_patterns:
+      metrical_data.LoadData()
+
+  def _Metres(self, padas):
+    return set(metrical_data.known_full_automaton.Matches(packed_pattern.Pack(''.join(padas))))
+
+  def testAccepted(self):
+    """Verses with the right mātrā-s in each pāda should be recognized."""
+    self.assertIn('Āryā', self._Metres([_PADA_12, _PADA_18, _PADA_12, _PADA_15]))
+    self.assertIn('Gīti', self._Metres([_PADA_12, _PADA_18, _PADA_12, _PADA_18]))
+    self.assertIn('Udgīti', self._Metres([_PADA_12, _PADA_15, _PADA_12, _PADA_18]))
+    # The last syllable of a pāda may be a laghu.
+    self.assertIn('Āryā', self._Metres([_PADA_12, _PADA_18, _PADA_12, _PADA_15[:-1] + 'L']))
+
+  def testRejected(self):
+    """A mātrā too many, or a gaṇa that is not allowed, should not be recognized."""
+    metres = self._Metres([_PADA_12, _PADA_18, _PADA_12, _PADA_15 + 'L'])
+    self.assertFalse(metres & set(['Āryā', 'Gīti', 'Udgīti']), metres)
+    # The sixth gaṇa may only be LLLL or LGL.
+    metres = self._Metres([_PADA_12, _PADA_18.replace('LGL', 'GG'), _PADA_12, _PADA_15])
+    self.assertNotIn('Āryā', metres)
+    self.assertIn('Āryā (loose schema)', metres)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for saving the metrical data to an index file, and loading it back."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import marshal
+import os
+import tempfile
+import unittest
+
+from data import metrical_data
+import identifier_pipeline
+
+
+def _Fresh():
+  """Empties the data structures (by reloading the module), as in a new process."""
+  reload(metrical_data)
+
+
+class Index(unittest.TestCase):
+
+  VERSES = ['karmaṇyevādhikāraste\nmā phaleṣu kadācana |\nmā karmaphalahetur bhūr\nmā te saṅgo stvakarmaṇi ||47||',
+            'siṃhaḥ śiśur api nipatati\nmada-malina-kapola-bhittiṣu gajeṣu |\nprakṛtir iyaṃ sattvavatāṃ\nna khalu vayas tejaso hetuḥ ||',
+            'kazcit kAntAvirahaguruNA svAdhikArAt pramattaH\nzApenAstaMgamitamahimA varSabhogyeNa bhartuH\n'
+            'yakSaz cakre janakatanayAsnAnapuNyodakeSu\nsnigdhacchAyAtaruSu vasatiM rAmagiryAzrameSu',
+            'स्मराहुताशनमुर्मुरचूर्णतां दधुरिवाम्रवनस्य रजःकणाः ।\nनिपातिताः परितः पथिकव्रजानुपरि ते परितेपुरतो भृशम् ॥']
+
+  def setUp(self):
+    if not metrical_data.all_data:
+      metrical_data.LoadData()
+    (handle, self.index_file) = tempfile.mkstemp()
+    os.close(handle)
+    metrical_data.SaveIndex(self.index_file)
+
+  def tearDown(self):
+    # Leave the data loaded, for the other tests.
+    os.remove(self.index_file)
+    _Fresh()
+    metrical_data.LoadData()
+
+  def _Identifications(self):
+    identifier = identifier_pipeline.IdentifierPipeline()
+    return [identifier.IdentifyFromText(verse) for verse in self.VERSES]
+
+  def _RewriteHeader(self, ChangeHeader):
+    with open(self.index_file, 'rb') as index:
+      header = marshal.load(index)
+      body = marshal.load(index)
+    with open(self.index_file, 'wb') as index:
+      marshal.dump(ChangeHeader(header), index)
+      marshal.dump(body, index)
+
+  def testSameResults(self):
+    """Identification with the data loaded from the index should be the same."""
+    expected = self._Identifications()
+    _Fresh()
+    self.assertTrue(metrical_data.LoadIndex(self.index_file))
+    self.assertEqual(self._Identifications(), expected)
+
+  def testWrongVersion(self):
+    self._RewriteHeader(lambda (version, module_names, fingerprint):
+                        (version + 1, module_names, fingerprint))
+    _Fresh()
+    self.assertFalse(metrical_data.LoadIndex(self.index_file))
+    self.assertFalse(metrical_data.all_data)
+
+  def testChangedSource(self):
+    self._RewriteHeader(lambda (version, module_names, fingerprint):
+                        (version, module_names, 'not the ' + fingerprint))
+    _Fresh()
+    self.assertFalse(metrical_data.LoadIndex(self.index_file))
+    self.assertFalse(metrical_data.all_data)
+
+
+if __name__ == '__main__':
+  unittest.main()
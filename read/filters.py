@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
-"""Cleanup transformations: simple functions which take text and return text."""
+"""Cleanup transformations: simple functions which take text and return text.
+
+The ones that split_gretil.split runs on each verse are listed (in order) at the
+end, and run by clean_verse.
+"""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
@@ -8,10 +12,12 @@ from collections import Counter
 from functools import wraps
 import logging
 import re
+import time
 import unicodedata
 
-def _match(regex, text):
-  return re.match('^' + regex + '$', text)
+def _whole(regex):
+  """regex, compiled (once) to match a whole text."""
+  return re.compile('^' + regex + '$')
 
 
 def process_crlf(text):
@@ -44,14 +50,17 @@ def process_html(text):
   return text
 
 
+_VERSE_END_MARKERS = [re.compile(re.escape(marker) + '.*') for marker in ['॥', '।।', '//', '||']]
+
+
 def remove_verse_numbers(text):
   """Strips everything after ॥, ।।, // or || in each line."""
   # return re.subn(r'[/|]{2}[ \d.a-zA-z}_*\-]*[/|]{2}$', '', line)
   lines = []
   for line in text.split('\n'):
-    for marker in ['॥', '।।', '//', '||']:
+    for marker in _VERSE_END_MARKERS:
       # If verse number was removed, can separate from next verse by blank line.
-      (line, count) = re.subn(re.escape(marker) + '.*', '\n', line)
+      (line, count) = marker.subn('\n', line)
       # Don't expect text to have more than one verse-end marker. Break at first.
       if count:
         break
@@ -59,8 +68,8 @@ def remove_verse_numbers(text):
   return '\n'.join(lines)
 
 
-def debug_rejected_characters(orig_line, rejects):
-  """Debug output about rejected characters, with their unicode codepoints and names."""
+def debug_rejected_characters(orig_line, rejects, trace):
+  """Adds to trace about rejected characters, with their unicode codepoints and names."""
   def _unicode_notation(char):
     """The U+92ef etc. notation for a character."""
     assert isinstance(char, unicode)
@@ -71,63 +80,85 @@ def debug_rejected_characters(orig_line, rejects):
   line_read_as = ''.join(_unicode_notation(c) if c in rejects else c for c in orig_line)
   rejects = [(c, _unicode_notation(c), unicodedata.name(c, 'Unknown')) for c in rejects]
   rejects = ', '.join('%s (%s %s)' % reject for reject in rejects)
-  logging.debug('Unknown characters are ignored: %s\nin line:\n%s', rejects, line_read_as)
+  trace.Add('Unknown characters are ignored: %s\nin line:\n%s', rejects, line_read_as)
+
+
+def debug_fixups(orig_line, fixups, trace):
+  """Adds to trace about characters that were read as others."""
+  for (before, after) in sorted(fixups):
+    trace.Add('%s is read as %s in line:\n%s', before, after, orig_line)
 
 
-def normalize_nfkc(text):
+def normalize_nfkc(text, trace=None):
   """Normalize text to NFKC."""
   nfkc = unicodedata.normalize('NFKC', text)
-  if text != nfkc:
-    logging.debug('%s normalized to %s', text, nfkc)
+  if text != nfkc and trace is not None:
+    trace.Add('%s normalized to %s', text, nfkc)
   if nfkc != unicodedata.normalize('NFC', text):
     logging.warning('NFC and NFKC normalizations differ for %s', text)
+    if trace is not None:
+      trace.Add('NFC and NFKC normalizations differ for %s', text)
   return nfkc
 
 
-def remove_control_characters(text):
-  """Remove non-printable (control) characters in text, and warn."""
+# Characters (in the BMP, so that this stays small) known not to be control characters.
+_NOT_CONTROL = set('\n')
+
+
+def remove_control_characters(text, trace=None):
+  """Remove non-printable (control) characters in text, and note them in trace."""
   text = text.replace('\t', ' ')  # a tab is a control character too
-  control = Counter(c for c in text if unicodedata.category(c).startswith('C') and c != '\n')
-  without_control = ''.join(c for c in text if c not in control)
-  if text != without_control:
-    logging.info('Removed control characters: %s', control)
+  characters = set(text)
+  if characters <= _NOT_CONTROL:
+    return text
+  # Look up the category of each distinct new character only.
+  control = set(c for c in characters - _NOT_CONTROL if unicodedata.category(c).startswith('C'))
+  _NOT_CONTROL.update(c for c in characters - control if ord(c) <= 0xFFFF)
+  if not control:
+    return text
+  without_control = text.translate(dict((ord(c), None) for c in control))
+  if trace is not None:
+    trace.Add('Removed control characters: %s', Counter(c for c in text if c in control))
   return without_control
 
 
-def split_further_at_verse_numbers(verses):
-  """Detect verses containing verse-end markers in them, and split them further."""
-  new_verses = []
-  for verse in verses:
-    current_verse_lines = []
-    lines = verse.split('\n')
-    for line in lines:
-      current_verse_lines.append(line)
-      if len(current_verse_lines) >= 2 and remove_verse_numbers(line) != line:
-        new_verses.append('\n'.join(current_verse_lines))
-        current_verse_lines = []
-    if current_verse_lines:
-      new_verses.append('\n'.join(current_verse_lines))
-  return new_verses
+def _split_at_verse_numbers(verse):
+  """The verses that one verse splits into, at its verse-end markers."""
+  current_verse_lines = []
+  for line in verse.split('\n'):
+    current_verse_lines.append(line)
+    if len(current_verse_lines) >= 2 and remove_verse_numbers(line) != line:
+      yield '\n'.join(current_verse_lines)
+      current_verse_lines = []
+  if current_verse_lines:
+    yield '\n'.join(current_verse_lines)
 
 
 # Gretil-specific filters below this line
+COMMENT_LINE = '<!---------------------------------------------------------><BR>\n'
+
+
 def after_second_comment_line(text):
   """Assuming text starts after second <!----...--><BR> line."""
-  split = '<!---------------------------------------------------------><BR>\n'
-  parts = text.split(split)
+  parts = text.split(COMMENT_LINE)
   if len(parts) == 3:
     return parts[2]
   logging.debug('Splitting at comment line gave %d parts.', len(parts))
   return text
 
 
+_PARENTHESIZED_LINE = _whole(r'^[(].*[)] ?<BR>$')
+_BLANK = _whole(r'^[ \t]*$')
+_UNDERLINE = _whole(r'^[_]{50,}<BR>')
+
+
 def is_parenthesized_line(text):
-  return bool(_match(r'^[(].*[)] ?<BR>$', text))
+  return bool(_PARENTHESIZED_LINE.match(text))
 
 
 def is_empty(text):
-  return (_match(r'^[ \t]*$', text) or text in ['<BR>', '***<BR>', ' <BR>'] or
-          _match(r'^[_]{50,}<BR>', text))
+  return (_BLANK.match(text) or text in ['<BR>', '***<BR>', ' <BR>'] or
+          _UNDERLINE.match(text))
 
 
 def _print_rejection(reason, if_different=False):
@@ -158,29 +189,36 @@ def is_header_line(text):
   return text in ['Main Text<BR>', 'ADDITIONAL VERSES (KṢEPAKA)<BR>']
 
 
+_FOOTNOTE_LINE = _whole(r'^\\footnote{.*<BR>$')
+_ASTERISKED_VARIANT_LINE = _whole(r'^[*].*<BR>\n.*<BR>$')
+_WORK_FOOTER_LINE = _whole(r'^[ \t]*(\|\| )?iti .* (samāptam|saṃpūrṇam|samāptaḥ).*<BR>$')
+_SECTION_HEADER_LINE = _whole(r'^\[[^ ]*\]<BR>')
+_ATHA_LINE = _whole(r'^(&nbsp;){5}atha ')
+
+
 def is_footnote_line(text):
-  return bool(_match(r'^\\footnote{.*<BR>$', text))
+  return bool(_FOOTNOTE_LINE.match(text))
 
 
 def is_asterisked_variant_line(text):
-  if _match(r'^[*].*<BR>\n.*<BR>$', text) or text == 'c: (^d guru^ C)<BR>':
+  if _ASTERISKED_VARIANT_LINE.match(text) or text == 'c: (^d guru^ C)<BR>':
     return True
 
 
 @_print_rejection('iti samAptam')
 def is_work_footer_line(text):
-  return bool(_match(r'^[ \t]*(\|\| )?iti .* (samāptam|saṃpūrṇam|samāptaḥ).*<BR>$', text)
+  return bool(_WORK_FOOTER_LINE.match(text)
               or text == 'śrīrāmodantaṃ samāptam |<BR>' or text == 'iti śubhaṃ bhūyāt |<BR>')
 
 
 def is_section_header_line(text):
-  return bool(_match(r'^\[[^ ]*\]<BR>', text))
+  return bool(_SECTION_HEADER_LINE.match(text))
 
 
 def remove_leading_section_header_line(verse):
   """A header at the top of a section."""
   lines = verse.split('\n')
-  if _match(r'^(&nbsp;){5}atha ', lines[0]) and remove_verse_numbers(lines[0]) != lines[0]:
+  if _ATHA_LINE.match(lines[0]) and remove_verse_numbers(lines[0]) != lines[0]:
     lines = lines[1:]
   if (lines[0] in ['nīti-śatakam<BR>', 'vairāgya-śatakam<BR>', 'śṛṅgāra-śatakam<BR>']
       and lines[1] == 'bhartṛhareḥ<BR>'):
@@ -241,8 +279,12 @@ def clean_leading_footnote(text):
     return text
 
 
+_VERSES_FOUND_ELSEWHERE_LINE = _whole(r'Verses found in .* not found here<BR>$')
+_ABBREVIATION_LINE = _whole(r'[^ \n]*\. = [^ \n]*(, )?<BR>$')
+
+
 def is_verses_found_elsewhere_line(text):
-  return bool(_match(r'Verses found in .* not found here<BR>$', text))
+  return bool(_VERSES_FOUND_ELSEWHERE_LINE.match(text))
 
 
 def _is_abbreviation_line(line):
@@ -254,7 +296,7 @@ sū. = sūktimuktāvalī, <BR>
 pad. = padyāvalī, <BR>
 śā. = śārṅgadharapaddhati<BR>
   """
-  return _match(r'[^ \n]*\. = [^ \n]*(, )?<BR>$', line)
+  return _ABBREVIATION_LINE.match(line)
 
 
 def is_abbreviation_block(text):
@@ -290,15 +332,131 @@ amarukaviracitam}<BR>
 āmarukaviracitam}}<BR>'''
 
 
+_VARIANT_LINE = re.compile(r'^\*VAR.:?[ ]*(\{|[0-9]{1,2}b)')
+
+
 @_print_rejection('variant line', if_different=True)
 def remove_trailing_variant_line(verse):
   """If 2-line verse has a '*VAR' line appended, trim it."""
   lines = verse.split('\n')
-  if len(lines) == 3 and re.match(r'^\*VAR.:?[ ]*(\{|[0-9]{1,2}b)', lines[2]):
+  if len(lines) == 3 and _VARIANT_LINE.match(lines[2]):
     return '\n'.join(lines[:2])
   return verse
 
 
+_WORK_HEADER_LINE = _whole('^Bhatṛhari: Śatakatraya.*<BR>$')
+
+
 def is_work_header_line(verse):
   return (verse in ['śrīrāmodantam |<BR>', 'Bhallaṭaśataka<BR>'] or
-          _match('^Bhatṛhari: Śatakatraya.*<BR>$', verse))
+          _WORK_HEADER_LINE.match(verse))
+
+
+# The rules that are run on each verse of a GRETIL file (see clean_verse), in
+# order. Each is named (in reports) by its function.
+VERSE_REWRITES = [
+    remove_trailing_parenthesized_line,
+    clean_leading_footnote,
+    remove_trailing_variant_line,
+    remove_leading_section_header_line,
+    process_html_spaces,
+]
+# Run after splitting at verse numbers; a verse is dropped at the first that holds.
+VERSE_REJECTIONS = [
+    is_parenthesized_line,
+    is_empty,
+    is_header_line,
+    is_footnote_line,
+    is_asterisked_variant_line,
+    is_footnote_followed_by_variant_line,
+    is_html_footer_line,
+    is_verses_found_elsewhere_line,
+    is_edition_info,
+    is_text_abbreviation_header,
+    is_parentheses_info,
+    is_trailing_work_name_junk,
+    is_section_header_line,
+    is_work_footer_line,
+    is_work_header_line,
+    is_abbreviation_block,
+]
+# Run on the verses that are kept.
+FINAL_REWRITES = [
+    clean_leading_br,
+    clean_leading_parenthesized_line,
+]
+
+
+class FilterStats(object):
+  """For each rule: how many verses it changed (or rejected), and the time spent in it."""
+
+  def __init__(self):
+    self.hits = Counter()
+    self.seconds = Counter()
+
+  def lines(self):
+    """A line about each rule that was run, in the order above."""
+    return ['%-40s %5d hits %8.2f ms' % (rule.__name__, self.hits[rule.__name__],
+                                         1000 * self.seconds[rule.__name__])
+            for rule in VERSE_REWRITES + VERSE_REJECTIONS + FINAL_REWRITES
+            if rule.__name__ in self.seconds]
+
+
+def _run(rule, verse, stats):
+  if stats is None:
+    return rule(verse)
+  start = time.time()
+  result = rule(verse)
+  stats.seconds[rule.__name__] += time.time() - start
+  return result
+
+
+def _rewrite(rules, verse, stats):
+  for rule in rules:
+    rewritten = _run(rule, verse, stats)
+    if stats is not None and rewritten != verse:
+      stats.hits[rule.__name__] += 1
+    verse = rewritten
+  return verse
+
+
+def _first_line_of(verse, lines, start):
+  """Where (from start on) the lines of verse are in lines, which it was cleaned up from.
+
+  The rules only drop lines at the start or end, and change &nbsp; within them.
+  """
+  verse_lines = verse.split('\n')
+  for first in range(start, len(lines) - len(verse_lines) + 1):
+    if all(process_html_spaces(line) == verse_line
+           for (line, verse_line) in zip(lines[first:], verse_lines)):
+      return first
+  return start
+
+
+def clean_verse(verse, stats=None):
+  """Runs all the rules on one verse (as split at <BR> lines), in one pass.
+
+  Yields (verse, rule, (first, end)) for each verse that it splits into at verse
+  numbers: either the cleaned verse and None, or the verse and the name of the
+  rule that rejected it; and the range of lines of the given verse that it is
+  made from. If a FilterStats is given, the hits and time of each rule are added
+  to it.
+  """
+  lines = verse.split('\n')
+  verse = _rewrite(VERSE_REWRITES, verse, stats)
+  start = _first_line_of(verse, lines, 0)
+  for new_verse in _split_at_verse_numbers(verse):
+    num_lines = new_verse.count('\n') + 1
+    new_verse = new_verse.strip('\n')
+    rejected_by = None
+    for rule in VERSE_REJECTIONS:
+      if _run(rule, new_verse, stats):
+        rejected_by = rule.__name__
+        break
+    if rejected_by is None:
+      new_verse = _rewrite(FINAL_REWRITES, new_verse, stats)
+    elif stats is not None:
+      stats.hits[rejected_by] += 1
+    first = _first_line_of(new_verse, lines, start)
+    yield (new_verse, rejected_by, (first, first + new_verse.count('\n') + 1))
+    start += num_lines
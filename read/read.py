@@ -4,20 +4,19 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import logging
-
 import read.filters
 import read.split_gretil
 import slp1
 import transliteration.detect
+from transliteration import devanagari
 from transliteration import transliterate
 
 
-def _preprocess_for_transliteration(text):
+def _preprocess_for_transliteration(text, trace):
   """Clean up text before transliterating."""
   text = read.filters.process_crlf(text)
-  text = read.filters.normalize_nfkc(text)
-  text = read.filters.remove_control_characters(text)
+  text = read.filters.normalize_nfkc(text, trace)
+  text = read.filters.remove_control_characters(text, trace)
   text = read.filters.process_html(text)
   # TODO(shreevatsa): Replace with a placeholder instead of removing entirely.
   text = read.filters.remove_verse_numbers(text)
@@ -25,23 +24,18 @@ def _preprocess_for_transliteration(text):
   return text
 
 
-def _transliterate_into_lines(orig_text, input_scheme):
-  """Transliterates text to SLP1, removing all other characters."""
-  pass_through = ' -?'
+def _transliterate_into_lines(orig_text, line_schemes, trace, line_cache):
+  """Transliterates text to SLP1 (each line from its scheme), removing all other characters."""
   cleaned_lines = []
   display_lines = []
-  for orig_line in orig_text.splitlines():
-    leading_verse_id = None
-    match = read.split_gretil.MSS_LINE_INITIAL_REGEX.match(orig_line)
-    if match:
-      leading_verse_id = match.group(0)
-      orig_line = orig_line[len(leading_verse_id):]
-    (display_line, rejects) = transliterate.TransliterateFrom(orig_line, input_scheme, pass_through)
-
-    ignore = r"""0123456789'".\/$&%{}|!’‘(),""" + 'ऽ।॥०१२३४५६७८९'
-    read.filters.debug_rejected_characters(orig_line, rejects - set(ignore))
-    cleaned_line = ''.join(c for c in display_line if c not in pass_through)
-    assert all(c in slp1.ALPHABET for c in cleaned_line), cleaned_line
+  for (orig_line, input_scheme) in zip(orig_text.splitlines(), line_schemes):
+    key = (input_scheme, orig_line)
+    lines = line_cache.Get(key) if line_cache is not None and trace is None else None
+    if lines is None:
+      lines = _transliterate_line(orig_line, input_scheme, trace)
+      if line_cache is not None:
+        line_cache.Put(key, lines)
+    (cleaned_line, display_line) = lines
     cleaned_lines.append(cleaned_line)
     display_lines.append(display_line)
   # while cleaned_lines and not cleaned_lines[-1]:
@@ -50,17 +44,46 @@ def _transliterate_into_lines(orig_text, input_scheme):
   return (cleaned_lines, display_lines)
 
 
-def read_text(text):
-  """The transliterated text from arbitrary input."""
-  text = _preprocess_for_transliteration(text)
-  input_scheme = transliteration.detect.detect_transliteration_scheme(text)
-  (cleaned_lines, display_lines) = _transliterate_into_lines(text, input_scheme)
+def _transliterate_line(orig_line, input_scheme, trace):
+  """The (cleaned, display) line in SLP1 for one line of input."""
+  pass_through = ' -?'
+  match = read.split_gretil.MSS_LINE_INITIAL_REGEX.match(orig_line)
+  if match:
+    leading_verse_id = match.group(0)
+    orig_line = orig_line[len(leading_verse_id):]
+  fixups = set() if trace is not None else None
+  (display_line, rejects) = transliterate.TransliterateFrom(orig_line, input_scheme, pass_through,
+                                                            fixups)
+
+  if trace is not None:
+    if (input_scheme == transliteration.detect.TRANSLITERATION_SCHEME.Devanagari and
+        devanagari.HasStrayVowelSigns(orig_line)):
+      trace.Add('Error in Devanāgari text %s: Stray vowel signs.', orig_line)
+    read.filters.debug_fixups(orig_line, fixups, trace)
+    ignore = r"""0123456789'".\/$&%{}|!’‘(),""" + 'ऽ।॥०१२३४५६७८९'
+    read.filters.debug_rejected_characters(orig_line, rejects - set(ignore), trace)
+  cleaned_line = ''.join(c for c in display_line if c not in pass_through)
+  assert all(c in slp1.ALPHABET for c in cleaned_line), cleaned_line
+  return (cleaned_line, display_line)
+
+
+def read_text(text, trace=None, line_cache=None):
+  """The transliterated text from arbitrary input.
+
+  If a utils.Trace is given, debug output about the reading is added to it.
+  Without a trace, lines already read in the same scheme are taken from
+  line_cache (a utils.LruCache) if one is given, instead of being read again.
+  """
+  text = _preprocess_for_transliteration(text, trace)
+  line_schemes = transliteration.detect.detect_scheme_of_each_line(text)
+  (cleaned_lines, display_lines) = _transliterate_into_lines(text, line_schemes, trace,
+                                                             line_cache)
 
-  debug_output = ['Input read as:']
-  for (number, display_line) in enumerate(display_lines):
-    transliterated = transliterate.TransliterateForOutput(display_line)
-    debug_output.append('Line %d: %s' % (number + 1, transliterated))
-  debug_output.append('')
-  logging.debug('\n'.join(debug_output))
+  if trace is not None:
+    trace.Add('Input read as:')
+    for (number, display_line) in enumerate(display_lines):
+      transliterated = transliterate.TransliterateForOutput(display_line)
+      trace.Add('Line %d: %s', number + 1, transliterated)
+    trace.Add('')
 
   return (cleaned_lines, display_lines)
@@ -13,13 +13,17 @@ MSS_LINE_INITIAL_REGEX = re.compile(r'^MSS_([0-9ABCD\-]+)-[1-5]')
 
 def mss_splitter(text):
   """Split by matching MSS-* id."""
-  verses = []
+  return [verse for (verse, _) in _mss_verses(enumerate(text.split('\n')))]
+
+
+def _mss_verses(numbered_lines):
+  """Yields (verse, (first, last)) for verses of lines that start with the same MSS-* id."""
   lines_of_current_verse = []
   last_seen_verse_id = None
-  ok_lines = [line for line in text.split('\n')
-              if not read.filters.is_html_footer_line(line)
-              and not read.filters.is_empty(line)]
-  for line in ok_lines:
+  (first, last) = (None, None)
+  for (number, line) in numbered_lines:
+    if read.filters.is_html_footer_line(line) or read.filters.is_empty(line):
+      continue
     match = MSS_LINE_INITIAL_REGEX.match(line)
     assert match, (line, 'line is #%s#' % line)
     current_verse_id = match.group(1)
@@ -27,16 +31,85 @@ def mss_splitter(text):
       lines_of_current_verse.append(line)
     else:
       if lines_of_current_verse:
-        verses.append('\n'.join(lines_of_current_verse))
+        yield ('\n'.join(lines_of_current_verse), (first, last))
       last_seen_verse_id = current_verse_id
       lines_of_current_verse = [line]
+      first = number
+    last = number
   if lines_of_current_verse:
-    verses.append('\n'.join(lines_of_current_verse))
-  return verses
-
-
-def split(text, custom_splitter=None):
-  """Split text into separate verses."""
+    yield ('\n'.join(lines_of_current_verse), (first, last))
+
+
+def _clean_line(line):
+  return read.filters.remove_control_characters(read.filters.normalize_nfkc(line))
+
+
+def _numbered_lines(source):
+  """Yields (line number, line) of source, cleaned up, after its second comment line.
+
+  source is a file opened with universal newlines (as by io.open), which is read
+  twice (once to count the comment lines), one line at a time. Together, the
+  lines (without their newlines) are what after_second_comment_line gives.
+  """
+  num_comment_lines = sum(1 for line in source
+                          if _clean_line(line).endswith(read.filters.COMMENT_LINE))
+  source.seek(0)
+  num_comment_lines_seen = 0 if num_comment_lines == 2 else 2
+  (number, line) = (0, '\n')
+  for (number, line) in enumerate(source, 1):
+    line = _clean_line(line)
+    if num_comment_lines_seen == 2:
+      yield (number, line.rstrip('\n'))
+    elif line.endswith(read.filters.COMMENT_LINE):
+      num_comment_lines_seen += 1
+  if line.endswith('\n') and num_comment_lines_seen == 2:
+    # Like text.split('\n'), an empty line after the last newline.
+    yield (number + 1, '')
+
+
+def _blocks_at_br(numbered_lines):
+  """Yields (first line number, lines) for each run of lines between <BR> lines."""
+  (first, lines) = (None, [])
+  for (number, line) in numbered_lines:
+    if line == '<BR>':
+      if lines:
+        yield (first, lines)
+      (first, lines) = (None, [])
+    else:
+      if not lines:
+        first = number
+      lines.append(line)
+  if lines:
+    yield (first, lines)
+
+
+def iter_verses(source, stats=None, mss=False):
+  """Yields (verse, (first line number, last line number)) for each verse of a GRETIL file.
+
+  The verses are those that split() gives, but source (a file opened with
+  io.open) is read one line at a time, and each verse is yielded as soon as it
+  is complete, so that only one verse at a time is kept. The line numbers
+  (starting at 1) are of the lines of the file that the verse is made from. If
+  mss is set, splits as mss_splitter does.
+  """
+  numbered_lines = _numbered_lines(source)
+  if mss:
+    for verse_and_lines in _mss_verses(numbered_lines):
+      yield verse_and_lines
+    return
+  for (first, lines) in _blocks_at_br(numbered_lines):
+    for (verse, rejected_by, (start, end)) in read.filters.clean_verse('\n'.join(lines), stats):
+      if rejected_by is None:
+        yield (verse, (first + start, first + end - 1))
+
+
+def split(text, custom_splitter=None, stats=None):
+  """Split text into separate verses.
+
+  Each verse goes through the rules in read.filters once (see
+  read.filters.clean_verse); if a read.filters.FilterStats is given, the hits
+  and time of each rule are added to it.
+  """
   text = read.filters.process_crlf(text)
   text = read.filters.normalize_nfkc(text)
   text = read.filters.remove_control_characters(text)
@@ -46,41 +119,10 @@ def split(text, custom_splitter=None):
   if custom_splitter:
     return (custom_splitter(text), text)
 
-  verses = read.filters.split_verses_at_br(text)
-
-  verses = map(read.filters.remove_trailing_parenthesized_line, verses)
-  verses = map(read.filters.clean_leading_footnote, verses)
-  verses = map(read.filters.remove_trailing_variant_line, verses)
-  verses = map(read.filters.remove_leading_section_header_line, verses)
-
-  verses = map(read.filters.process_html_spaces, verses)
-
-  # Tracer()()
-
-  verses = read.filters.split_further_at_verse_numbers(verses)
-
-  verses = [verse.strip('\n') for verse in verses]
-  verses = [verse for verse in verses if
-            not read.filters.is_parenthesized_line(verse) and
-            not read.filters.is_empty(verse) and
-            not read.filters.is_header_line(verse) and
-            not read.filters.is_footnote_line(verse) and
-            not read.filters.is_asterisked_variant_line(verse) and
-            not read.filters.is_footnote_followed_by_variant_line(verse) and
-            not read.filters.is_html_footer_line(verse) and
-            not read.filters.is_verses_found_elsewhere_line(verse) and
-            # not read.filters.starts_with_br(verse) and
-            not read.filters.is_edition_info(verse) and
-            not read.filters.is_text_abbreviation_header(verse) and
-            not read.filters.is_parentheses_info(verse) and
-            not read.filters.is_trailing_work_name_junk(verse) and
-            not read.filters.is_section_header_line(verse) and
-            not read.filters.is_work_footer_line(verse) and
-            not read.filters.is_work_header_line(verse) and
-            not read.filters.is_abbreviation_block(verse)]
-
-  verses = map(read.filters.clean_leading_br, verses)
-  verses = map(read.filters.clean_leading_parenthesized_line, verses)
+  verses = [verse
+            for verse_at_br in read.filters.split_verses_at_br(text)
+            for (verse, rejected_by, _) in read.filters.clean_verse(verse_at_br, stats)
+            if rejected_by is None]
 
   # Print('These are verses:')
   # for (i, verse) in enumerate(verses):
@@ -98,46 +140,40 @@ def split(text, custom_splitter=None):
 _DONT_HIGHLIGHT = False
 _HIGHLIGHT = True
 
-def find_verse_in_text(verse, text):
-  """Yields (blocks, consumed) where blocks are (text_fragment, should_highlight),
-  and consumed is the number of characters consumed in text."""
-  # Print('Trying to find verse %s in text of length %d' % (verse, len(text)))
-  words = re.split(r'(\s+)', verse)
-  for word in words:
-    assert word in text, (text, verse, word)
-    where = text.find(word)
-    yield (text[:where], _DONT_HIGHLIGHT)
-    assert text[where : where + len(word)] == word
-    # Print('Yielding found word: %s, %s' % (word, _HIGHLIGHT))
-    yield (word, _HIGHLIGHT)
-    text = text[where + len(word):]
-
-
-def individual_blocks_of_verses_in_text(verses, text):
-  """Splits text into blocks of text; each block is (text, should_highlight)."""
-  while verses:
-    verse = verses.pop(0)
-    consumed = 0
-    for block in find_verse_in_text(verse, text):
-      consumed += len(block[0])
-      yield block
-    text = text[consumed:]
-  if text:
-    # Print('Leftover text after all verses: %s' % text)
-    yield (text, _DONT_HIGHLIGHT)
+def _word_spans(verses, text):
+  """Yields (start, end, should_highlight) for the words of the verses, and the text between them.
+
+  Each word (or run of whitespace) of each verse is looked for in text after the
+  previous one, so text is gone through once, and is not copied.
+  """
+  position = 0
+  for verse in verses:
+    for word in re.split(r'(\s+)', verse):
+      where = text.find(word, position)
+      assert where >= 0, (text[position:], verse, word)
+      yield (position, where, _DONT_HIGHLIGHT)
+      yield (where, where + len(word), _HIGHLIGHT)
+      position = where + len(word)
+  yield (position, len(text), _DONT_HIGHLIGHT)
+
+
+def spans_of_verses_in_text(verses, text):
+  """Splits text into spans (start, end, selected), where selected spans are of the verses."""
+  (current_start, current_end, current_selected) = (0, 0, None)
+  for (start, end, selected) in _word_spans(verses, text):
+    if start == end:
+      continue
+    if selected == current_selected:
+      current_end = end
+    else:
+      if current_start < current_end:
+        yield (current_start, current_end, current_selected)
+      (current_start, current_end, current_selected) = (start, end, selected)
+  if current_start < current_end:
+    yield (current_start, current_end, current_selected)
 
 
 def blocks_of_verses_in_text(verses, text):
   """Splits text into blocks of selected and not selected."""
-  current_block = ('', None)
-  for block in individual_blocks_of_verses_in_text(verses, text):
-    if block[0] == '':
-      continue
-    if block[1] == current_block[1]:
-      current_block = (current_block[0] + block[0], block[1])
-    else:
-      if current_block[0]:
-        yield current_block
-      current_block = block
-  if current_block[0]:
-    yield current_block
+  for (start, end, selected) in spans_of_verses_in_text(verses, text):
+    yield (text[start:end], selected)
@@ -1,47 +1,162 @@
-"""Given lines in SLP1, converts them to patterns of laghus and gurus."""
+"""Given lines in SLP1, converts them to patterns of laghus and gurus.
+
+A syllable is a vowel followed by all the consonants before the next vowel. It
+is guru if its vowel is long, or if it has two or more consonants, or (for the
+last syllable of the verse) any consonant at all; else it is laghu. Consonants
+at the start of a line belong to the last syllable of the previous line.
+
+Each line is read once, left to right, looking up each character in a table.
+Characters outside slp1.ALPHABET (like the spaces and hyphens kept in the lines
+shown to the user) are skipped, so the lines can be scanned as displayed, and
+ScanVerse can also say where each syllable is in them.
+"""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import re
 import slp1
 
-_SYLLABLE_RE = slp1.VOWEL_RE + slp1.CONSONANT_RE + '*'
+_CONSONANT = 0
+_SHORT_VOWEL = 1
+_LONG_VOWEL = 2
+_OTHER = 3
+
+
+def _CharacterKinds():
+  kinds = {}
+  for c in slp1.ALPHABET:
+    if c not in slp1.VOWELS:
+      kinds[c] = _CONSONANT
+    elif c in slp1.LONG_VOWEL_RE:
+      kinds[c] = _LONG_VOWEL
+    else:
+      kinds[c] = _SHORT_VOWEL
+  return kinds
+_KINDS = _CharacterKinds()
+
+
+def ScanVerse(lines, with_spans=False):
+  """The pattern (string over {'L', 'G'}) of each line.
+
+  With with_spans, returns (patterns, spans), where spans has a (line, start,
+  end) for each syllable of the verse, in the line containing its vowel. As
+  displayed, a syllable starts after the last space or hyphen (if any) before
+  its vowel, so that words are not split, and runs until the next syllable
+  starts, or to the end of the line.
+  """
+  scanned = [_ScanLine(line) for line in lines]
+  patterns = [_LinePattern(scanned, i) for i in range(len(scanned))]
+  if not with_spans:
+    return patterns
+  spans = []
+  for (i, line) in enumerate(lines):
+    spans.extend(_LineSpans(i, line, scanned[i]))
+  return (patterns, spans)
+
+
+class IncrementalScan(object):
+  """The scan of a verse that is edited a little at a time.
+
+  Update takes all the lines each time (as a form would send them), but only
+  lines that changed are scanned again. As consonants at the start of a line
+  belong to the previous line, a change to a line can change the pattern of
+  the line before it too, and a change in the number of lines can change which
+  line is last; only those patterns are worked out again.
+  """
 
+  def __init__(self):
+    self.lines = []
+    self.patterns = []
+    self._scanned = []
 
-def ScanVerse(lines):
-  cleaned_lines = _MoveInitialConsonants(lines)
-  return [_ScanVowelInitialLine(cleaned_lines[i], i == len(cleaned_lines) - 1)
-          for i in range(len(cleaned_lines))]
+  def Update(self, lines):
+    """Changes the verse to these lines. Returns the indices of lines whose pattern changed."""
+    lines = list(lines)
+    old_patterns = self.patterns
+    scanned = self._scanned[:len(lines)]
+    redo = set()
+    for (i, line) in enumerate(lines):
+      if i < len(self.lines) and self.lines[i] == line:
+        continue
+      if i < len(scanned):
+        scanned[i] = _ScanLine(line)
+      else:
+        scanned.append(_ScanLine(line))
+      redo.update([i - 1, i])
+    if len(lines) != len(self.lines):
+      redo.update([len(lines) - 1, len(self.lines) - 1])
+    patterns = old_patterns[:len(lines)]
+    patterns.extend([None] * (len(lines) - len(patterns)))
+    for i in redo:
+      if 0 <= i < len(lines):
+        patterns[i] = _LinePattern(scanned, i)
+    self.lines = lines
+    self.patterns = patterns
+    self._scanned = scanned
+    return [i for (i, pattern) in enumerate(patterns)
+            if i >= len(old_patterns) or old_patterns[i] != pattern]
 
+  def Spans(self):
+    """The spans of the syllables, as returned by ScanVerse."""
+    spans = []
+    for (i, line) in enumerate(self.lines):
+      spans.extend(_LineSpans(i, line, self._scanned[i]))
+    return spans
 
-def _MoveInitialConsonants(verse_lines):
-  """Move initial consonants of each line to the end of the previous line."""
-  for i in xrange(len(verse_lines)):
-    (consonants, verse_lines[i]) = _StripInitialConsonants(verse_lines[i])
-    if i > 0 and verse_lines[i - 1]:
-      verse_lines[i - 1] += consonants
-  return verse_lines
 
+def _LinePattern(scanned, i):
+  """The pattern of line i, given the _ScanLine of each line."""
+  (_, weights, is_long, final_consonants, _) = scanned[i]
+  if weights is None:
+    return ''
+  if i + 1 < len(scanned):
+    final_consonants += scanned[i + 1][0]
+  is_last_line = i == len(scanned) - 1
+  return ''.join(weights) + ('G' if (is_long or final_consonants >= 2 or
+                                     is_last_line and final_consonants) else 'L')
 
-def _StripInitialConsonants(text):
-  m = re.match(slp1.CONSONANT_RE + '+', text)
-  initial = m.group() if m else ''
-  return (initial, text[len(initial):])
 
+def _LineSpans(i, line, scanned_line):
+  starts = scanned_line[4]
+  return [(i, start, starts[k + 1] if k + 1 < len(starts) else len(line))
+          for (k, start) in enumerate(starts)]
 
-def _Weight(syllable, is_final_syllable_of_line=False):
-  """Whether a syllable (vowel + sequence of consonants) is laghu or guru."""
-  assert re.match('^%s$' % _SYLLABLE_RE, syllable), syllable
-  if re.search(slp1.LONG_VOWEL_RE, syllable): return 'G'
-  if re.search(slp1.CONSONANT_RE + '{2,}', syllable): return 'G'
-  if is_final_syllable_of_line and re.search(slp1.CONSONANT_RE, syllable):
-    return 'G'
-  return 'L'
 
+def _ScanLine(text):
+  """Returns (number of initial consonants, weights, is_long, final_consonants, starts).
 
-def _ScanVowelInitialLine(text, is_last_line=False):
-  syllables = re.findall(_SYLLABLE_RE, text)
-  assert text == ''.join(syllables), text
-  if len(syllables) == 0: return ''
-  return (''.join(_Weight(s) for s in syllables[:-1]) +
-          _Weight(syllables[-1], is_final_syllable_of_line=is_last_line))
+  weights are those of all syllables but the last, whose weight can depend on
+  the next line: is_long is whether its vowel is long, and final_consonants
+  the number of consonants after it. If there is no vowel, weights is None.
+  starts are where the syllables start, as displayed (see ScanVerse).
+  """
+  initial_consonants = 0
+  weights = None
+  is_long = False
+  consonants = 0
+  starts = []
+  # Where the current syllable could end, when shown: after its vowel, or
+  # after a later space etc.
+  shown_end = 0
+  kinds = _KINDS
+  for (i, c) in enumerate(text):
+    kind = kinds.get(c, _OTHER)
+    if kind == _CONSONANT:
+      consonants += 1
+    elif kind == _OTHER:
+      shown_end = i + 1
+    elif weights is None:
+      initial_consonants = consonants
+      weights = []
+      is_long = kind == _LONG_VOWEL
+      consonants = 0
+      starts.append(shown_end)
+      shown_end = i + 1
+    else:
+      weights.append('G' if is_long or consonants >= 2 else 'L')
+      is_long = kind == _LONG_VOWEL
+      consonants = 0
+      starts.append(shown_end)
+      shown_end = i + 1
+  if weights is None:
+    initial_consonants = consonants
+  return (initial_consonants, weights, is_long, consonants, starts)
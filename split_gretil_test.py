@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for splitting GRETIL files into verses."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import unittest
+
+import read.filters
+import read.split_gretil
+
+# Lines of a small GRETIL file (numbered from 1).
+_GRETIL_LINES = [
+    '<html><body>',
+    read.filters.COMMENT_LINE.rstrip('\n'),
+    'Header<BR>',
+    read.filters.COMMENT_LINE.rstrip('\n'),
+    '<BR>',
+    'kazcit kAntA<BR>',                  # 6
+    'virahaguruRA<BR>',
+    '<BR>',
+    'yakza cakre<BR>',                   # 9
+    'janakatanayA // 1 //<BR>',
+    '*VAR. {a} b<BR>',                   # trailing variant line, dropped
+    '<BR>',
+    'iti śubhaṃ bhūyāt |<BR>',          # rejected
+    '<BR>',
+    '</font></body></html>',
+]
+
+
+class IterVerses(unittest.TestCase):
+
+  def testSameAsSplit(self):
+    """The streamed verses should be split()'s, with the lines of the file they are from."""
+    expected = [('kazcit kAntA<BR>\nvirahaguruRA<BR>', (6, 7)),
+                ('yakza cakre<BR>\njanakatanayA // 1 //<BR>', (9, 10))]
+    for final_newline in ['\n', '']:
+      for newline in ['\n', '\r\n']:
+        text = newline.join(_GRETIL_LINES) + final_newline.replace('\n', newline)
+        verses = list(read.split_gretil.iter_verses(io.StringIO(text, newline=None)))
+        self.assertEqual(verses, expected)
+        self.assertEqual([verse for (verse, _) in verses], read.split_gretil.split(text)[0])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -28,5 +28,5 @@ if __name__ == '__main__':
   logging.getLogger().setLevel(logging.WARNING)
   from_stdin = sys.stdin.read().decode('utf8')
   identifier = identifier_pipeline.IdentifierPipeline()
-  identifier.IdentifyFromText(from_stdin)
-  print_utils.Print(identifier.AllDebugOutput())
+  identification = identifier.IdentifyFromText(from_stdin)
+  print_utils.Print(identification.AllDebugOutput())
@@ -7,6 +7,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import argparse
 import codecs
+import io
 import json
 import logging
 import os.path
@@ -16,6 +17,7 @@ from IPython.core.debugger import Tracer
 assert Tracer  # to slience Pyflakes
 
 from print_utils import Print
+import read.filters
 import read.split_gretil
 import identifier_pipeline
 
@@ -42,6 +44,9 @@ def get_args():
   argument_parser.add_argument('--break_at_error', action='store_true',
                                help='Whether to break as soon as one imperfect'
                                ' verse is found.')
+  argument_parser.add_argument('--print_filter_stats', action='store_true',
+                               help='Whether to print how often each cleanup rule'
+                               ' fired, and the time spent in it.')
   return argument_parser.parse_args()
 
 
@@ -62,36 +67,38 @@ if __name__ == '__main__':
   input_file_name = args.input_file
   set_up_logger(input_file_name)
 
-  text = codecs.open(input_file_name, 'r', 'utf-8').read()
-  custom_splitter = read.split_gretil.mss_splitter if 'msubhs_u.htm' in input_file_name else None
-  (verses, text) = read.split_gretil.split(text, custom_splitter=custom_splitter)
-  # blocks = list(read.split_gretil.blocks_of_verses_in_text(verses, text))
+  filter_stats = read.filters.FilterStats() if args.print_filter_stats else None
+  with io.open(input_file_name, encoding='utf-8') as input_file:
+    verses = [verse for (verse, _) in read.split_gretil.iter_verses(
+        input_file, stats=filter_stats, mss='msubhs_u.htm' in input_file_name)]
   Print('There are %d verses.' % len(verses))
+  if filter_stats is not None:
+    Print('\n'.join(filter_stats.lines()))
 
   identifier = identifier_pipeline.IdentifierPipeline()
+  identifications = identifier.IdentifyBatch(verses)
   table = {}
-  for (verse_number, verse) in enumerate(verses):
+  for (verse_number, (verse, identification)) in enumerate(zip(verses, identifications)):
     verse_number += 1
     Print('\nVerse %d is:' % verse_number)
     Print('\n    '.join(('    ' + verse).splitlines()))
     Print('End Verse %d' % verse_number)
-    ok_and_results = identifier.IdentifyFromText(verse)
-    if not ok_and_results:      # None for lines that contain no syllables
+    if identification.results is None:      # None for lines that contain no syllables
       continue
-    (perfect, results) = ok_and_results
+    (perfect, results) = (identification.full_match, identification.results)
     if not results:
       table['unknown'] = table.get('unknown', 0) + 1
       if args.print_unidentified_verses != 'none':
         Print('Verse %4d:' % verse_number)
         if args.print_unidentified_verses == 'full':
           Print(verse)
-          Print(identifier.AllDebugOutput())
+          Print(identifier.IdentifyFromText(verse).AllDebugOutput())
           Print('')
       continue
 
     # We've dealt with the case where there are no results
     assert results
-    assert isinstance(results, list)
+    assert isinstance(results, tuple)
     metre_name = results[0]
     if args.print_identified_verses != 'none':
       Print('Verse %4d is%sin %s' % (
@@ -103,7 +110,7 @@ if __name__ == '__main__':
     table[metre_name] = table.get(metre_name, 0) + 1
     if not perfect and args.break_at_error:
       Print(verse)
-      Print(identifier.AllDebugOutput())
+      Print(identifier.IdentifyFromText(verse).AllDebugOutput())
       Print('')
       break
 
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for detecting and transliterating the input scheme."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import marshal
+import os
+import tempfile
+import unittest
+
+import read.read
+from transliteration.detect import TRANSLITERATION_SCHEME
+from transliteration import detect
+from transliteration import transliterate
+from transliteration import transliterator
+from utils.utils import Trace
+
+
+class BrahmicScripts(unittest.TestCase):
+
+  def testKnown(self):
+    """Each script should be detected, and read to SLP1."""
+    for (scheme, text) in [
+        (TRANSLITERATION_SCHEME.Devanagari, 'कर्मण्येवाधिकारस्ते'),
+        (TRANSLITERATION_SCHEME.Kannada, 'ಕರ್ಮಣ್ಯೇವಾಧಿಕಾರಸ್ತೇ'),
+        (TRANSLITERATION_SCHEME.Telugu, 'కర్మణ్యేవాధికారస్తే'),
+        (TRANSLITERATION_SCHEME.Malayalam, 'കര്മണ്യേവാധികാരസ്തേ'),
+        (TRANSLITERATION_SCHEME.Gujarati, 'કર્મણ્યેવાધિકારસ્તે'),
+        (TRANSLITERATION_SCHEME.Gurmukhi, 'ਕਰ੍ਮਣ੍ਯੇਵਾਧਿਕਾਰਸ੍ਤੇ'),
+        (TRANSLITERATION_SCHEME.Oriya, 'କର୍ମଣ୍ୟେଵାଧିକାରସ୍ତେ'),
+        (TRANSLITERATION_SCHEME.Grantha,
+         '\U00011315\U00011330\U0001134D\U0001132E\U00011323\U0001134D\U0001132F'
+         '\U00011347\U00011335\U0001133E\U00011327\U0001133F\U00011315\U0001133E'
+         '\U00011330\U00011338\U0001134D\U00011324\U00011347')]:
+      self.assertEqual(detect.detect_transliteration_scheme(text), scheme)
+      self.assertEqual(transliterate.TransliterateFrom(text, scheme),
+                       ('karmaRyevADikAraste', set()))
+
+  def testSouthernLetters(self):
+    """Short e and o, and the Malayalam chillu-s, are read as the nearest letters."""
+    self.assertEqual(transliterate.TransliterateFrom('ಕೆಲೊ', TRANSLITERATION_SCHEME.Kannada),
+                     ('kelo', set()))
+    self.assertEqual(transliterate.TransliterateFrom('ഭക്തൻ', TRANSLITERATION_SCHEME.Malayalam),
+                     ('Baktan', set()))
+
+  def testPriority(self):
+    """A character of an earlier scheme anywhere in the text decides it."""
+    self.assertEqual(detect.detect_transliteration_scheme('kAla'), TRANSLITERATION_SCHEME.HK)
+    self.assertEqual(detect.detect_transliteration_scheme('kaala kāla'),
+                     TRANSLITERATION_SCHEME.IAST)
+    self.assertEqual(detect.detect_transliteration_scheme('kāla काल ಕಾಲ'),
+                     TRANSLITERATION_SCHEME.Kannada)
+    self.assertEqual(detect.detect_transliteration_scheme('কাল ಕಾಲ'),
+                     TRANSLITERATION_SCHEME.Kannada)
+
+
+class Fixups(unittest.TestCase):
+
+  def testReported(self):
+    """Characters read as others should be reported, each once."""
+    fixups = set()
+    self.assertEqual(transliterate.TransliterateFrom('kr̥̄ṁ kr̥ṁ', TRANSLITERATION_SCHEME.IAST, ' ',
+                                                     fixups),
+                     ('kFM kfM', set()))
+    self.assertEqual(fixups, set([('r̥̄', 'ṝ'), ('r̥', 'ṛ'), ('ṁ', 'ṃ')]))
+    fixups = set()
+    self.assertEqual(transliterate.TransliterateFrom('कळ', TRANSLITERATION_SCHEME.Devanagari,
+                                                     fixups=fixups),
+                     ('kala', set()))
+    self.assertEqual(fixups, set([('ळ', 'ल')]))
+
+
+class StrayVowelSigns(unittest.TestCase):
+
+  def testReported(self):
+    """A vowel sign not after a consonant should be reported in the debug output."""
+    trace = Trace()
+    read.read.read_text('कि िख', trace)
+    self.assertIn('Error in Devanāgari text कि िख: Stray vowel signs.', trace.Lines())
+    trace = Trace()
+    read.read.read_text('किख', trace)
+    self.assertFalse(any('Stray vowel signs' in line for line in trace.Lines()))
+
+
+class MixedScripts(unittest.TestCase):
+
+  def testEachLine(self):
+    """Lines in a script are read from it, the others from the Roman scheme of the text."""
+    text = 'कर्मण्येवाधिकारस्ते\nkarmaṇi eva\nadhikaras te\n\nಮಾ ಫಲೇಷು'
+    self.assertEqual(detect.detect_scheme_of_each_line(text),
+                     [TRANSLITERATION_SCHEME.Devanagari, TRANSLITERATION_SCHEME.IAST,
+                      TRANSLITERATION_SCHEME.IAST, TRANSLITERATION_SCHEME.IAST,
+                      TRANSLITERATION_SCHEME.Kannada])
+    self.assertEqual(detect.detect_transliteration_scheme(text), TRANSLITERATION_SCHEME.Kannada)
+    self.assertEqual(read.read.read_text(text)[0],
+                     ['karmaRyevADikAraste', 'karmaRieva', 'aDikaraste', '', 'mAPalezu'])
+
+
+class Index(unittest.TestCase):
+
+  def setUp(self):
+    (handle, self.index_file) = tempfile.mkstemp()
+    os.close(handle)
+    transliterate.SaveIndex(self.index_file)
+
+  def tearDown(self):
+    os.remove(self.index_file)
+
+  def _RewriteHeader(self, header):
+    with open(self.index_file, 'rb') as index:
+      marshal.load(index)
+      body = marshal.load(index)
+    with open(self.index_file, 'wb') as index:
+      marshal.dump(header, index)
+      marshal.dump(body, index)
+
+  def testSameStateMachines(self):
+    """State machines loaded from the index should transliterate as the built ones."""
+    indexed = transliterate._LoadIndex(self.index_file)
+    self.assertEqual(sorted(indexed), sorted(transliterate._state_machines))
+    for (name, data) in indexed.items():
+      state_machine = transliterator.StateMachine()
+      state_machine.FromData(data)
+      self.assertEqual(state_machine.ToData(), transliterate._state_machines[name].ToData())
+    state_machine = transliterator.StateMachine()
+    state_machine.FromData(indexed['IAST to SLP1'])
+    self.assertEqual(transliterator.Transliterate(state_machine, 'karmaṇyevādhikāraste'),
+                     transliterator.Transliterate(transliterate._IAST_TO_SLP1_STATE_MACHINE,
+                                                  'karmaṇyevādhikāraste'))
+
+  def testWrongVersion(self):
+    self._RewriteHeader((transliterate._INDEX_FORMAT_VERSION + 1,
+                         transliterate._SourceFingerprint()))
+    self.assertEqual(transliterate._LoadIndex(self.index_file), {})
+
+  def testChangedSource(self):
+    self._RewriteHeader((transliterate._INDEX_FORMAT_VERSION,
+                         'not the ' + transliterate._SourceFingerprint()))
+    self.assertEqual(transliterate._LoadIndex(self.index_file), {})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Brahmic scripts whose Unicode blocks are laid out like Devanāgari's.
+
+The Unicode blocks of the major Brahmic scripts follow the same layout (that of
+ISCII), so that the letter at the same offset from the start of each block is
+the "same" letter: Bengali ক (U+0995) is Devanāgari क (U+0915), Telugu క
+(U+0C15) and so on. So a single table from Devanāgari to SLP1 (see
+devanagari.ToSLP1Table), with each character moved by the offset of the block,
+reads each of these scripts straight to SLP1.
+
+Some of these scripts have letters that Sanskrit in Devanāgari does without
+(like the short e and o of the southern scripts); these are read as the nearest
+letters, as is done for Kannada. A few letters outside the common layout (like
+the Malayalam chillu-s) are added for each script.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import slp1
+from transliteration import devanagari
+
+# Script name -> offset of its block from the Devanāgari block (U+0900), in the
+# order in which they are tried when detecting the script.
+SCRIPTS = [
+    ('Kannada', 0x0380),
+    ('Bengali', 0x0080),
+    ('Gujarati', 0x0180),
+    ('Gurmukhi', 0x0100),
+    ('Oriya', 0x0200),
+    ('Telugu', 0x0300),
+    ('Malayalam', 0x0400),
+    ('Grantha', 0x10A00),
+]
+
+# Letters and vowel signs (in Devanāgari) -> the ones they are read as.
+_VARIANTS = {
+    'ऎ': 'ए',  # short e
+    'ऒ': 'ओ',  # short o
+    'ॆ': 'े',  # vowel sign short e
+    'ॊ': 'ो',  # vowel sign short o
+    'ळ': 'ल',  # ḷa
+    'ऱ': 'र',  # ṟa
+    'ऴ': 'ल',  # ḻa
+}
+
+# Code points outside the common layout, for each script.
+# Consonants, which take vowel signs like the others:
+_EXTRA_CONSONANTS = {
+    'Bengali': {0x09DF: 'y'},                  # yya
+    'Oriya': {0x0B5F: 'y', 0x0B71: 'v'},       # yya, wa
+    'Kannada': {0x0CDE: 'l'},                  # ḻa (fa)
+}
+# Consonants without a vowel:
+_EXTRA_FINALS = {
+    'Bengali': {0x09CE: 't'},                  # khaṇḍa ta
+    'Gurmukhi': {0x0A70: 'M'},                 # ṭippī (anusvāra)
+    'Malayalam': {0x0D7A: 'R', 0x0D7B: 'n', 0x0D7C: 'r', 0x0D7D: 'l',
+                  0x0D7E: 'l', 0x0D7F: 'k'},   # chillu-s
+}
+# Vowel signs:
+_EXTRA_SIGNS = {
+    'Malayalam': {0x0D57: 'E'},                # au length mark
+    'Grantha': {0x11357: 'E'},                 # au length mark
+}
+
+_OFFSETS = dict(SCRIPTS)
+
+
+def _Char(code_point):
+  """unichr, also for code points beyond U+FFFF on narrow builds."""
+  return ('\\U%08x' % code_point).decode('unicode-escape')
+
+
+def _Moved(text, offset):
+  return ''.join(_Char(ord(c) + offset) for c in text)
+
+
+def ToSLP1Table(script):
+  """Table from the script to SLP1, for transliterator.MakeStateMachine."""
+  offset = _OFFSETS[script]
+  table = dict((_Moved(key, offset), value)
+               for (key, value) in devanagari.ToSLP1Table(slp1.ALPHABET, _VARIANTS).items())
+  consonants = [key for (key, value) in table.items() if len(value) == 2 and value[1] == 'a']
+  for (code_point, vowel) in _EXTRA_SIGNS.get(script, {}).items():
+    for consonant in consonants:
+      table[consonant + _Char(code_point)] = table[consonant][:-1] + vowel
+  # Each extra consonant is read like ka, with k replaced.
+  ka = _Moved('क', offset)
+  for (code_point, consonant) in _EXTRA_CONSONANTS.get(script, {}).items():
+    for (key, value) in table.items():
+      if key.startswith(ka):
+        table[_Char(code_point) + key[len(ka):]] = consonant + value[1:]
+  for (code_point, final) in _EXTRA_FINALS.get(script, {}).items():
+    table[_Char(code_point)] = final
+  return table
+
+
+def BlockRegex(script):
+  """A regex for any character in the Unicode block of the script."""
+  (first, last) = (_Char(0x0900 + _OFFSETS[script]), _Char(0x097F + _OFFSETS[script]))
+  if len(first) == 1:
+    return '[%s-%s]' % (first, last)
+  # A narrow build, with the block beyond U+FFFF: the same high surrogate, then a low one.
+  return '%s[%s-%s]' % (first[0], first[1], last[1])
@@ -6,8 +6,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import re
 
+from transliteration import brahmic
 from transliteration import devanagari
-from transliteration.transliteration_data import KANNADA_CONSONANTS
 
 def Enum(**enums):
   return type(str('Enum'), (), enums)
@@ -19,23 +19,79 @@ TRANSLITERATION_SCHEME = type(str('Enum'),
                                 'IAST': 1,
                                 'ITRANS': 2,
                                 'Devanagari': 3,
-                                'Kannada': 4
+                                'Kannada': 4,
+                                'Bengali': 5,
+                                'Gujarati': 6,
+                                'Gurmukhi': 7,
+                                'Oriya': 8,
+                                'Telugu': 9,
+                                'Malayalam': 10,
+                                'Grantha': 11,
                               })
 
+# Characteristic characters of each scheme, in order of priority: text with any
+# character of a scheme is in that scheme, unless it also has a character of an
+# earlier one. (The other Brahmic scripts come before Devanāgari, as Kannada
+# always did.) Text with none of them is in HK.
+_CHARACTERISTIC = [(getattr(TRANSLITERATION_SCHEME, name), brahmic.BlockRegex(name))
+                   for (name, _) in brahmic.SCRIPTS] + [
+    (TRANSLITERATION_SCHEME.Devanagari, '[%s]' % ''.join(devanagari.Alphabet())),
+    # With the ISO 15919 letters that are read as IAST ones (r̥ is r + U+0325).
+    (TRANSLITERATION_SCHEME.IAST, '[āīūṛṝḷḹṃḥṅñṭḍṇśṣṁēō\u0325]'),
+    (TRANSLITERATION_SCHEME.ITRANS, r'aa|ii|uu|[RrLl]\^[Ii]|RR[Ii]|LL[Ii]|~N|Ch|~n|N\^|Sh|sh'),
+]
+# For each priority, a regex for the schemes before it, each as a named group.
+_REGEXES_BEFORE = [re.compile('|'.join('(?P<s%d>%s)' % (scheme, regex)
+                                       for (scheme, regex) in _CHARACTERISTIC[:n]))
+                   for n in range(len(_CHARACTERISTIC) + 1)]
+_PRIORITY = dict((scheme, n) for (n, (scheme, _)) in enumerate(_CHARACTERISTIC))
+# Priority -> scheme, with HK last.
+_SCHEMES_BY_PRIORITY = [scheme for (scheme, _) in _CHARACTERISTIC] + [TRANSLITERATION_SCHEME.HK]
+
+
+_ROMAN_SCHEMES = [TRANSLITERATION_SCHEME.IAST, TRANSLITERATION_SCHEME.ITRANS,
+                  TRANSLITERATION_SCHEME.HK]
+
+
+def _DetectWithPriority(text):
+  """(scheme, priority) for the text.
+
+  Goes through the text once: after finding a character of some scheme, looks
+  further only for the schemes before it.
+  """
+  (scheme, priority) = (TRANSLITERATION_SCHEME.HK, len(_CHARACTERISTIC))
+  position = 0
+  while priority:
+    match = _REGEXES_BEFORE[priority].search(text, position)
+    if not match:
+      break
+    scheme = int(match.lastgroup[1:])
+    priority = _PRIORITY[scheme]
+    position = match.end()
+  return (scheme, priority)
+
 
 def detect_transliteration_scheme(text):
   """Returns which transliteration scheme the given text is in."""
-  characteristic_kannada = '[%s]' % KANNADA_CONSONANTS
-  if re.search(characteristic_kannada, text):
-    return TRANSLITERATION_SCHEME.Kannada
-  characteristic_devanagari = '[%s]' % ''.join(devanagari.Alphabet())
-  if re.search(characteristic_devanagari, text):
-    return TRANSLITERATION_SCHEME.Devanagari
-  characteristic_iast = '[āīūṛṝḷḹṃḥṅñṭḍṇśṣ]'
-  if re.search(characteristic_iast, text):
-    return TRANSLITERATION_SCHEME.IAST
-  characteristic_itrans = (r'aa|ii|uu|[RrLl]\^[Ii]|RR[Ii]|LL[Ii]|~N|Ch|~n|N\^'
-                           + r'|Sh|sh')
-  if re.search(characteristic_itrans, text):
-    return TRANSLITERATION_SCHEME.ITRANS
-  return TRANSLITERATION_SCHEME.HK
+  return _DetectWithPriority(text)[0]
+
+
+def detect_scheme_of_each_line(text):
+  """Returns the scheme of each line of text (as in text.splitlines()).
+
+  A line with characters of some script (Devanāgari or another Brahmic script)
+  is in that script. The other lines are all in the same Roman scheme (IAST,
+  ITRANS or HK), detected from all of them together as for a whole text: a line
+  without diacritics is read like the rest of the romanized text around it. So
+  a Devanāgari verse with a commentary in IAST is read line by line.
+  """
+  schemes = []
+  roman_priority = len(_CHARACTERISTIC)
+  for line in text.splitlines():
+    (scheme, priority) = _DetectWithPriority(line)
+    if scheme in _ROMAN_SCHEMES:
+      roman_priority = min(roman_priority, priority)
+      scheme = None
+    schemes.append(scheme)
+  roman_scheme = _SCHEMES_BY_PRIORITY[roman_priority]
+  return [roman_scheme if line_scheme is None else line_scheme for line_scheme in schemes]
@@ -33,6 +33,38 @@ def Alphabet():
               _ANUSVARA_VISARGA) + [s + _VIRAMA for s in _CONSONANTS]
 
 
+def ToSLP1Table(slp1_alphabet, variants=None):
+  """Table from standard Devanāgari to the alphabet (in the order of Alphabet()).
+
+  Besides each letter, it has each consonant with its inherent 'a', with
+  virāma, and with each vowel sign, so that reading the longest key at each
+  point (as transliterator does) gives the same result as reading
+  Mangle(text) with zip(Alphabet(), slp1_alphabet), in one pass.
+
+  variants maps other letters and vowel signs to the ones they are read as.
+  """
+  num_letters = len(_VOWELS + _ANUSVARA_VISARGA)
+  letters = dict(zip(_VOWELS + _ANUSVARA_VISARGA, slp1_alphabet[:num_letters]))
+  consonants = dict(zip(_CONSONANTS, slp1_alphabet[num_letters:]))
+  signs = dict(zip(_VOWEL_SIGNS, slp1_alphabet[1:len(_VOWELS)]))
+  signs[_VIRAMA] = ''
+  for (variant, standard) in (variants or {}).items():
+    for group in [letters, consonants, signs]:
+      if standard in group:
+        group[variant] = group[standard]
+  table = dict(letters)
+  for (consonant, transliterated) in consonants.items():
+    table[consonant] = transliterated + slp1_alphabet[0]
+    for (sign, vowel) in signs.items():
+      table[consonant + sign] = transliterated + vowel
+  return table
+
+
+def HasStrayVowelSigns(text):
+  """Whether the text has a vowel sign that does not follow a consonant."""
+  return re.search('(?<!%s)%s' % (_CONSONANT_RE, _VOWEL_SIGNS_RE), text) is not None
+
+
 def Mangle(text):
   """Normalize standard Devanāgari to Mangled Devanāgari."""
   orig_text = text
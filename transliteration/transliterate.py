@@ -4,14 +4,69 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
+import marshal
+import os.path
+import re
+
 import slp1
 from transliteration.detect import TRANSLITERATION_SCHEME
+from transliteration import brahmic
 from transliteration import devanagari
-from transliteration.transliteration_data import KANNADA_CONSONANTS
 from transliteration import transliterator
 
 _DEFAULT_PASS_THROUGH = ' -?'
 
+# Bump this when the layout of the index file changes.
+_INDEX_FORMAT_VERSION = 1
+_TOP_LEVEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_FILE = os.path.join(_TOP_LEVEL_DIR, 'transliteration', 'state_machines.index')
+# Modules that the state machines are built from.
+_SOURCE_MODULES = ['slp1', 'transliteration.brahmic', 'transliteration.devanagari',
+                   'transliteration.transliterate', 'transliteration.transliterator']
+
+
+def _SourceFingerprint():
+  digest = hashlib.sha1()
+  for module_name in _SOURCE_MODULES:
+    module_file = os.path.join(_TOP_LEVEL_DIR, *module_name.split('.')) + '.py'
+    with open(module_file, 'rb') as source:
+      digest.update(source.read())
+  return digest.hexdigest()
+
+
+def _LoadIndex(index_file):
+  """Name -> data of each state machine in the file written by SaveIndex (if up to date)."""
+  try:
+    with open(index_file, 'rb') as index:
+      (version, fingerprint) = marshal.load(index)
+      if version != _INDEX_FORMAT_VERSION or fingerprint != _SourceFingerprint():
+        return {}
+      return marshal.load(index)
+  except (IOError, EOFError, ValueError, TypeError):
+    return {}
+_indexed_state_machines = _LoadIndex(DEFAULT_INDEX_FILE)
+_state_machines = {}
+
+
+def _StateMachine(name, MakeTable):
+  """The state machine for the table MakeTable(), from the index file if it is there."""
+  if name in _indexed_state_machines:
+    state_machine = transliterator.StateMachine()
+    state_machine.FromData(_indexed_state_machines[name])
+  else:
+    state_machine = transliterator.MakeStateMachine(MakeTable())
+  _state_machines[name] = state_machine
+  return state_machine
+
+
+def SaveIndex(index_file=DEFAULT_INDEX_FILE):
+  """Writes the state machines to a file, so that they need not be built on import."""
+  with open(index_file, 'wb') as index:
+    marshal.dump((_INDEX_FORMAT_VERSION, _SourceFingerprint()), index)
+    marshal.dump(dict((name, state_machine.ToData())
+                      for (name, state_machine) in _state_machines.items()), index)
+
 
 def _AlphabetToSLP1(alphabet):
   """Table to SLP1, given a transliteration's alphabet in standard order."""
@@ -30,8 +85,8 @@ _HK_ALPHABET = (list('aAiIuUR') + ['RR', 'lR', 'lRR', 'e', 'ai', 'o', 'au'] +
                  't', 'th', 'd', 'dh', 'n',
                  'p', 'ph', 'b', 'bh', 'm'] +
                 list('yrlvzSsh'))
-_HK_TO_SLP1_STATE_MACHINE = transliterator.MakeStateMachine(
-    _AlphabetToSLP1(_HK_ALPHABET))
+_HK_TO_SLP1_STATE_MACHINE = _StateMachine(
+    'HK to SLP1', lambda: _AlphabetToSLP1(_HK_ALPHABET))
 
 
 _IAST_ALPHABET_LOWER = (list('aāiīuūṛṝḷḹe') + ['ai', 'o', 'au', 'ṃ', 'ḥ'] +
@@ -50,17 +105,17 @@ _IAST_ALPHABET_UPPER = (list('AĀIĪUŪṚṜḶḸE') + ['AI', 'O', 'AU', 'Ṃ'
                          'Y', 'R', 'L', 'V', 'Ś', 'Ṣ', 'S', 'H'])
 
 
-def _IASTToSLP1StateMachine():
+def _IASTToSLP1Table():
   """Transliteration table from IAST to SLP1."""
   lower = _AlphabetToSLP1(_IAST_ALPHABET_LOWER)
   upper = _AlphabetToSLP1(_IAST_ALPHABET_UPPER)
   lower.update(upper)
-  return transliterator.MakeStateMachine(lower)
-_IAST_TO_SLP1_STATE_MACHINE = _IASTToSLP1StateMachine()
+  return lower
+_IAST_TO_SLP1_STATE_MACHINE = _StateMachine('IAST to SLP1', _IASTToSLP1Table)
 
 
-_SLP1_TO_IAST_STATE_MACHINE = transliterator.MakeStateMachine(
-    _SLP1ToAlphabet(_IAST_ALPHABET_LOWER))
+_SLP1_TO_IAST_STATE_MACHINE = _StateMachine(
+    'SLP1 to IAST', lambda: _SLP1ToAlphabet(_IAST_ALPHABET_LOWER))
 
 
 _ITRANS_ALPHABET = (['a', 'aa', 'i', 'ii', 'u', 'uu', 'RRi', 'RRI',
@@ -73,93 +128,95 @@ _ITRANS_ALPHABET = (['a', 'aa', 'i', 'ii', 'u', 'uu', 'RRi', 'RRI',
                      'y', 'r', 'l', 'v', 'sh', 'Sh', 's', 'h'])
 
 
-def _ITRANSToSLP1StateMachine():
+def _ITRANSToSLP1Table():
   table = _AlphabetToSLP1(_ITRANS_ALPHABET)
   alternatives = [('aa', 'A'), ('ii', 'I'), ('uu', 'U'), ('RRi', 'R^i'),
                   ('RRI', 'R^I'), ('LLi', 'L^i'), ('LLI', 'L^I'),
                   ('~N', 'N^'), ('~n', 'JN'), ('v', 'w')]
   for (letter, alternative) in alternatives:
     table[alternative] = table[letter]
-  return transliterator.MakeStateMachine(table)
-_ITRANS_TO_SLP1_STATE_MACHINE = _ITRANSToSLP1StateMachine()
+  return table
+_ITRANS_TO_SLP1_STATE_MACHINE = _StateMachine('ITRANS to SLP1', _ITRANSToSLP1Table)
 
 
-_MANGLED_DEVANAGARI_TO_SLP1_STATE_MACHINE = transliterator.MakeStateMachine(
-    _AlphabetToSLP1(devanagari.Alphabet()))
+_DEVANAGARI_TO_SLP1_STATE_MACHINE = _StateMachine(
+    'Devanagari to SLP1', lambda: devanagari.ToSLP1Table(slp1.ALPHABET))
 
 
 def _TransliterateDevanagari(text):
-  return transliterator.Transliterate(_MANGLED_DEVANAGARI_TO_SLP1_STATE_MACHINE,
-                                      devanagari.Mangle(text),
+  return transliterator.Transliterate(_DEVANAGARI_TO_SLP1_STATE_MACHINE, text,
                                       _DEFAULT_PASS_THROUGH)
 
 
-def _IsoToIast(text):
-  text = text.replace('ṁ', 'ṃ')
-  text = text.replace('ē', 'e')
-  text = text.replace('ō', 'o')
-  text = text.replace('r̥̄', 'ṝ')
-  text = text.replace('r̥', 'ṛ')
-  text = text.replace('l̥̄', 'ḹ')
-  text = text.replace('l̥', 'ḷ')
-  return text
-
-
-def _FixBadDevanagari(text):
-  # TODO(shreevatsa): Warn about these "wrong" characters.
-  text = text.replace('ऎ', 'ए')
-  text = text.replace('ऒ', 'ओ')
-  text = text.replace('ॆ', 'े')
-  text = text.replace('ॊ', 'ो')
-  text = text.replace('ळ', 'ल')
-  text = text.replace('ॐ', 'ओं')
-  text = text.replace(u'\u1CF2', 'ः')  # VEDIC SIGN ARDHAVISARGA
-  text = text.replace(u'\u1CF3', 'ः')  # VEDIC SIGN ROTATED ARDHAVISARGA
-  text = text.replace(u'\u1CF5', 'ः')  # VEDIC SIGN JIHVAMULIYA
-  text = text.replace(u'\u1CF6', 'ः')  # VEDIC SIGN UPADHMANIYA
-  return text
-
-
-_KANNADA_VOWEL_SIGNS = 'ಕಾ ಕಿ ಕೀ ಕು ಕೂ ಕೃ ಕೄ ಕೆ ಕೇ ಕೈ ಕೊ ಕೋ ಕೌ ಕಂ ಕಃ ಕ್'
-_KANNADA_VOWEL_SIGNS = ''.join(_KANNADA_VOWEL_SIGNS[i]
-                               for i in range(len(_KANNADA_VOWEL_SIGNS))
-                               if i % 3 == 1)
-_DEVANAGARI_VOWEL_SIGNS = 'का कि की कु कू कृ कॄ कॆ के कै कॊ को कौ कं कः क्'
-_DEVANAGARI_VOWEL_SIGNS = ''.join(_DEVANAGARI_VOWEL_SIGNS[i]
-                                  for i in range(len(_DEVANAGARI_VOWEL_SIGNS))
-                                  if i % 3 == 1)
-_DEVANAGARI_CONSONANTS = 'कखगघङचछजझञटठडढणतथदधनपफबभमयरलवशषसहळरळ'
-_KANNADA_VOWELS = 'ಅಆಇಈಉಊಋೠಎಏಐಒಓಔ'
-_DEVANAGARI_VOWELS = 'अआइईउऊऋॠऎएऐऒओऔ'
-_KANNADA_AV = 'ಅಂ ಅಃ'
-_KANNADA_AV = ''.join(_KANNADA_AV[i]
-                      for i in range(len(_KANNADA_AV)) if i % 3 == 1)
-_DEVANAGARI_AV = 'अं अः'
-_DEVANAGARI_AV = ''.join(_DEVANAGARI_AV[i]
-                         for i in range(len(_DEVANAGARI_AV)) if i % 3 == 1)
-_KANNADA_TO_DEVANAGARI = transliterator.MakeStateMachine(dict(zip(
-    _KANNADA_VOWELS + _KANNADA_AV + KANNADA_CONSONANTS + _KANNADA_VOWEL_SIGNS,
-    _DEVANAGARI_VOWELS + _DEVANAGARI_AV + _DEVANAGARI_CONSONANTS +
-    _DEVANAGARI_VOWEL_SIGNS)))
-
-
-def KannadaToDevanagari(text):
-  return transliterator.Transliterate(_KANNADA_TO_DEVANAGARI, text,
-                                      pass_through=_DEFAULT_PASS_THROUGH)[0]
-
-
-def TransliterateFrom(input_text, input_scheme, pass_through=None):
-  """Transliterates text to SLP1, after being told what script it is."""
-  input_text = _IsoToIast(input_text)
-
-  def ForKannada(text):
-    text = KannadaToDevanagari(text)
-    text = _FixBadDevanagari(text)
-    text = text.replace('s', 'ऽ')
-    return _TransliterateDevanagari(text)
+# Characters (or sequences) of the input that are read as others.
+_ISO_TO_IAST = {
+    'ṁ': 'ṃ',
+    'ē': 'e',
+    'ō': 'o',
+    'r̥̄': 'ṝ',
+    'r̥': 'ṛ',
+    'l̥̄': 'ḹ',
+    'l̥': 'ḷ',
+}
+_BAD_DEVANAGARI = {
+    'ऎ': 'ए',
+    'ऒ': 'ओ',
+    'ॆ': 'े',
+    'ॊ': 'ो',
+    'ळ': 'ल',
+    'ॐ': 'ओं',
+    u'\u1CF2': 'ः',  # VEDIC SIGN ARDHAVISARGA
+    u'\u1CF3': 'ः',  # VEDIC SIGN ROTATED ARDHAVISARGA
+    u'\u1CF5': 'ः',  # VEDIC SIGN JIHVAMULIYA
+    u'\u1CF6': 'ः',  # VEDIC SIGN UPADHMANIYA
+}
+
+
+def _FixupsRegex(fixups):
+  """A regex for the keys of fixups: the longer ones first, then a class of single characters."""
+  longer = sorted((key for key in fixups if len(key) > 1), key=len, reverse=True)
+  single = ''.join(key for key in fixups if len(key) == 1)
+  return re.compile('|'.join([re.escape(key) for key in longer] + ['[%s]' % single]))
+_ISO_TO_IAST_REGEX = _FixupsRegex(_ISO_TO_IAST)
+# Devanāgari input gets both, in the same pass.
+_DEVANAGARI_FIXUPS = dict(_ISO_TO_IAST)
+_DEVANAGARI_FIXUPS.update(_BAD_DEVANAGARI)
+_DEVANAGARI_FIXUPS_REGEX = _FixupsRegex(_DEVANAGARI_FIXUPS)
+
+
+def _Fix(text, fixups, regex, made):
+  """Makes the fixups in one pass over text, adding the (from, to) pairs made to the set made."""
+  def Replacement(match):
+    replacement = fixups[match.group()]
+    if made is not None:
+      made.add((match.group(), replacement))
+    return replacement
+  return regex.sub(Replacement, text)
+
+
+# Scheme -> state machine straight to SLP1, for the other Brahmic scripts.
+_BRAHMIC_TO_SLP1_STATE_MACHINES = dict(
+    (getattr(TRANSLITERATION_SCHEME, name),
+     _StateMachine('%s to SLP1' % name, lambda name=name: brahmic.ToSLP1Table(name)))
+    for (name, _) in brahmic.SCRIPTS)
+
+
+def TransliterateFrom(input_text, input_scheme, pass_through=None, fixups=None):
+  """Transliterates text to SLP1, after being told what script it is.
+
+  Some characters are first read as others (like ISO 15919 'ṁ' as IAST 'ṃ'); if
+  a set fixups is given, the (from, to) pairs that were read so are added to it.
+  """
+  if input_scheme == TRANSLITERATION_SCHEME.Devanagari:
+    input_text = _Fix(input_text, _DEVANAGARI_FIXUPS, _DEVANAGARI_FIXUPS_REGEX, fixups)
+  else:
+    input_text = _Fix(input_text, _ISO_TO_IAST, _ISO_TO_IAST_REGEX, fixups)
+
+  if input_scheme in _BRAHMIC_TO_SLP1_STATE_MACHINES:
+    return transliterator.Transliterate(_BRAHMIC_TO_SLP1_STATE_MACHINES[input_scheme], input_text,
+                                        _DEFAULT_PASS_THROUGH)
 
   actions = {
-      TRANSLITERATION_SCHEME.Kannada: ForKannada,
       TRANSLITERATION_SCHEME.Devanagari:
       lambda text: _TransliterateDevanagari(text),
       TRANSLITERATION_SCHEME.IAST:
@@ -171,8 +228,8 @@ def TransliterateFrom(input_text, input_scheme, pass_through=None):
   return actions[input_scheme](input_text)
 
 
-_SLP1_TO_MANGLED_DEVANAGARI_STATE_MACHINE = transliterator.MakeStateMachine(
-    _SLP1ToAlphabet(devanagari.Alphabet()))
+_SLP1_TO_MANGLED_DEVANAGARI_STATE_MACHINE = _StateMachine(
+    'SLP1 to Mangled Devanagari', lambda: _SLP1ToAlphabet(devanagari.Alphabet()))
 
 
 def _CleanSLP1ToDevanagari(text):
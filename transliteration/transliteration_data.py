@@ -1,7 +0,0 @@
-# -*- coding: utf-8 -*-
-
-"""Detecting the input scheme."""
-
-from __future__ import absolute_import, division, print_function, unicode_literals
-
-KANNADA_CONSONANTS = 'ಕಖಗಘಙಚಛಜಝಞಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಳಱೞ'
@@ -29,6 +29,10 @@ but when you see 'k', go into a state where
 
 So each "state" is a dict containing two values for every "key" (character): on
 seeing that character, which state to go to, and how many characters to consume.
+
+The trie of such states is then flattened into a list (see StateMachine), so
+that each step is a single dict lookup, and the tables can be saved and loaded
+(with marshal) instead of being built again.
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
@@ -43,43 +47,82 @@ def MakeStateMachine(table):
     for c in key:
       where = where.setdefault(c, {})
     where[''] = value
-  return root
-
-
-def _LongestRead(state_machine, text):
-  """Finds longest match from state machine at start of the text."""
-  where = state_machine
-  num_seen = 0
-  num_matched = 0
-  replacement = None
-  for c in text:
-    num_seen += 1
-    where = where.get(c)
-    if not where:
-      return (num_matched, replacement)
-    if '' in where:  # If there's a key that terminates here
-      num_matched = num_seen
-      replacement = where['']
-  return (num_matched, replacement)
+  return StateMachine(root)
+
+
+class StateMachine(object):
+  """The trie of a transliteration table, as flat lists.
+
+  The states are numbered from 0 (the start state), in breadth-first order. On
+  seeing character c in state s, go to state transitions[s].get(c) (None if
+  there is no such state). replacements[s] is the replacement for the key that
+  ends at state s, or None if no key ends there.
+  """
+  __slots__ = ['transitions', 'replacements']
+
+  def __init__(self, trie=None):
+    self.transitions = []
+    self.replacements = []
+    if trie is None:
+      return
+    nodes = [trie]
+    while len(self.transitions) < len(nodes):
+      node = nodes[len(self.transitions)]
+      row = {}
+      for (c, child) in sorted(node.items()):
+        if c:
+          row[c] = len(nodes)
+          nodes.append(child)
+      self.transitions.append(row)
+      self.replacements.append(node.get(''))
+
+  def ToData(self):
+    """The tables as plain lists and dicts, e.g. for marshal."""
+    return (self.transitions, self.replacements)
+
+  def FromData(self, data):
+    """Replaces the tables with ones returned by ToData."""
+    (self.transitions, self.replacements) = data
 
 
 def Transliterate(state_machine, text, pass_through=None):
-  """Transliterates text using the state machine."""
-  transliterated = ''
+  """Transliterates text using the state machine.
+
+  Returns (transliterated text, set of characters that could not be read).
+  At each position, the longest key starting there is replaced, without copying
+  the rest of the text, so this takes time linear in the length of the text
+  (times the length of the longest key).
+  """
+  transitions = state_machine.transitions
+  replacements = state_machine.replacements
+  start_transitions = transitions[0]
+  transliterated = []
   unparsed_characters = set()
   num_parsed = 0
-  while num_parsed < len(text):
-    # TODO(shreevatsa): Is text[num_parsed:] doing many copies for long text?
-    (num_matched, replacement) = _LongestRead(state_machine, text[num_parsed:])
+  end = len(text)
+  while num_parsed < end:
+    # Find the longest match at num_parsed.
+    state = start_transitions.get(text[num_parsed])
+    num_matched = 0
+    replacement = None
+    i = num_parsed
+    while state is not None:
+      i += 1
+      if replacements[state] is not None:  # If there's a key that terminates here
+        num_matched = i - num_parsed
+        replacement = replacements[state]
+      if i == end:
+        break
+      state = transitions[state].get(text[i])
     if num_matched > 0:
-      transliterated += replacement
+      transliterated.append(replacement)
       num_parsed += num_matched
     else:
-      # Couldn't match anything; strip one char and retry.
+      # Couldn't match anything; skip one char and retry.
       char = text[num_parsed]
       if pass_through and char in pass_through:
-        transliterated += char
+        transliterated.append(char)
       else:
         unparsed_characters.add(char)
       num_parsed += 1
-  return (transliterated, unparsed_characters)
+  return (''.join(transliterated), unparsed_characters)
@@ -4,34 +4,75 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import io
-import logging
-
-
-def call_with_log_capture(function, *args, **kwargs):
-  """Call the function with args and kwargs, and return both its result and logging."""
-  logger = logging.getLogger()
-  # NOTE: logger.level, logger.handlers, handler.level are all undocumented API.
-  original_logger_level = logger.level
-  original_handler_levels = [handler.level for handler in logger.handlers]
-  for handler in logger.handlers:
-    handler.setLevel(max(handler.level, original_logger_level))
-  logger.setLevel(logging.DEBUG)
-  log_capturer_stream = io.StringIO()
-  log_capture_handler = logging.StreamHandler(log_capturer_stream)
-  log_capture_handler.setLevel(logging.DEBUG)
-  logger.addHandler(log_capture_handler)
-
-  return_value = function(*args, **kwargs)
-
-  log_contents = log_capturer_stream.getvalue()
-  log_capturer_stream.close()
-  logger.removeHandler(log_capture_handler)
-  for (i, handler) in enumerate(logger.handlers):
-    handler.setLevel(original_handler_levels[i])
-  logger.setLevel(original_logger_level)
-
-  if log_contents:
-    assert log_contents[-1] == '\n'
-    log_contents = log_contents[:-1]
-  return (return_value, log_contents)
+
+class Trace(object):
+  """Debug output collected during a single call.
+
+  Functions that can produce debug output take an optional trace (None by
+  default), and do the work of formatting their messages only when given one.
+  Each call gets its own Trace, so nothing is shared between threads.
+  """
+
+  def __init__(self):
+    self._lines = []
+
+  def Add(self, message, *args):
+    """Adds a message (which can have several lines), formatted with args if any."""
+    if args:
+      message = message % args
+    self._lines.append(message)
+
+  def Lines(self):
+    return tuple(self._lines)
+
+  def Text(self):
+    return '\n'.join(self._lines)
+
+
+class LruCache(object):
+  """A cache of at most max_size entries, dropping the least recently used ones.
+
+  To keep each lookup to a couple of dict operations, recency is tracked in two
+  generations rather than exactly: entries used since the current generation
+  began are kept, and when it fills up (to half of max_size), the entries not
+  used in the last two generations are dropped.
+
+  Counts hits and misses, to see whether the cache is worth having. Not
+  thread-safe: use one per thread (or per batch of work).
+  """
+
+  def __init__(self, max_size):
+    assert max_size >= 2
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self._current = {}
+    self._previous = {}
+
+  def __len__(self):
+    return len(self._current) + sum(1 for key in self._previous if key not in self._current)
+
+  def Get(self, key):
+    """The value for key, or None if it is not in the cache."""
+    value = self._current.get(key)
+    if value is None:
+      value = self._previous.get(key)
+      if value is None:
+        self.misses += 1
+        return None
+      self._Put(key, value)
+    self.hits += 1
+    return value
+
+  def Put(self, key, value):
+    assert value is not None
+    self._Put(key, value)
+
+  def _Put(self, key, value):
+    if len(self._current) >= self.max_size // 2:
+      self._previous = self._current
+      self._current = {}
+    self._current[key] = value
+
+  def Stats(self):
+    return 'cache: %d entries, %d hits, %d misses' % (len(self), self.hits, self.misses)
@@ -7,13 +7,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from google.appengine.ext.webapp import template
 import webapp2
 
+from data.metrical_data import DisplayName as MetreDisplayName
 from data.metrical_data import HtmlDescription as MetreHtmlDescription
-from transliteration import transliterate
 
 def _display_name(metre_name):
   assert isinstance(metre_name, unicode)
-  both_names = transliterate.AddDevanagariToIast(metre_name)
-  return '<font size="+2">%s</font>' % both_names
+  return '<font size="+2">%s</font>' % MetreDisplayName(metre_name)
 
 
 class IdentifyPage(webapp2.RequestHandler):
@@ -33,13 +32,14 @@ class IdentifyPage(webapp2.RequestHandler):
     full_match = None
     results = None
     result_display_names = None
-    if identification and identification[1]:
-      (full_match, results) = identification
+    if identification.results:
+      full_match = identification.full_match
+      results = identification.results
       result_display_names = [_display_name(m) for m in results]
 
     metre_blocks = []
-    if identifier.tables:
-      for (name, table) in identifier.tables:
+    if identification.tables:
+      for (name, table) in identification.tables:
         metre_block = {
             'metre_description' : MetreHtmlDescription(name),
             'metre_name': _display_name(name),
@@ -66,9 +66,9 @@ The issue is:
                               'first_result_display_name': (result_display_names[0]
                                                             if result_display_names else None),
                               'result_display_names': result_display_names,
-                              'debug_read': identifier.DebugRead(),
-                              'debug_scan': identifier.DebugScan(),
-                              'debug_identify': identifier.DebugIdentify(),
+                              'debug_read': identification.DebugRead(),
+                              'debug_scan': identification.DebugScan(),
+                              'debug_identify': identification.DebugIdentify(),
                               'metre_blocks': metre_blocks,
                               'bug_title': bug_title,
                               'bug_body': bug_body,